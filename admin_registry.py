@@ -0,0 +1,54 @@
+import sqlite3
+from datetime import datetime
+
+
+# --- سجل المسؤولين في الذاكرة ---
+# يُحمَّل جدول admins مرة واحدة، وتُخدَم استعلامات الصلاحية من قاموس بدون أي I/O.
+# الكتابات المحلية تُحدّث الذاكرة مباشرة، أما تغييرات العمليات الأخرى فتُكتشف
+# دورياً عبر PRAGMA data_version الذي يتغير عند كل commit من اتصال آخر.
+class AdminRegistry:
+    def __init__(self, db):
+        self.db = db
+        self._admins = {}
+        self._data_version = None
+
+    @staticmethod
+    def _snapshot(conn):
+        version = conn.execute("PRAGMA data_version").fetchone()[0]
+        rows = conn.execute("SELECT user_id, username, full_name, added_at FROM admins").fetchall()
+        return version, rows
+
+    async def load(self):
+        version, rows = await self.db.run(self._snapshot)
+        self._admins = {row[0]: row for row in rows}
+        self._data_version = version
+
+    async def refresh(self):
+        version = (await self.db.fetchone("PRAGMA data_version"))[0]
+        if version != self._data_version:
+            await self.load()
+            return True
+        return False
+
+    def is_admin(self, user_id):
+        return str(user_id) in self._admins
+
+    def get(self, user_id):
+        return self._admins.get(str(user_id))
+
+    def all(self):
+        return list(self._admins.values())
+
+    async def add(self, user_id, username=None, full_name=None):
+        row = (str(user_id), username, full_name, datetime.now())
+        try:
+            await self.db.execute("INSERT INTO admins (user_id, username, full_name, added_at) VALUES (?, ?, ?, ?)", row)
+        except sqlite3.IntegrityError:
+            return False
+        self._admins[row[0]] = row
+        return True
+
+    async def remove(self, user_id):
+        rows_affected = await self.db.execute("DELETE FROM admins WHERE user_id=?", (str(user_id),))
+        self._admins.pop(str(user_id), None)
+        return rows_affected > 0
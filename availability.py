@@ -0,0 +1,96 @@
+import json
+import time
+from datetime import timedelta
+
+WINDOW_OCCUPANCY_SQL = (
+    "SELECT location, booking_date, people FROM occupancy "
+    "WHERE location IN (SELECT value FROM json_each(?)) AND booking_date >= ? AND booking_date <= ?"
+)
+CELL_OCCUPANCY_SQL = "SELECT people FROM occupancy WHERE location=? AND booking_date=?"
+ACTIVE_HOLDS_SQL = "SELECT user_id, location, booking_date, people, expires_at FROM seat_holds WHERE expires_at > ?"
+
+
+def read_cells(conn, cells):
+    # تُستدعى داخل معاملة الكتابة نفسها بعد تعديل الحجوزات: قيم الإشغال الجديدة
+    # للخلايا المتأثرة فقط، لتمريرها إلى OccupancyGrid.apply
+    return {cell: (conn.execute(CELL_OCCUPANCY_SQL, cell).fetchone() or (0,))[0] for cell in set(cells)}
+
+
+# --- شبكة الإشغال للأيام القادمة ---
+# نسخة في الذاكرة من جدول occupancy (الذي تحدّثه القوادح) لكل (موقع، يوم) ضمن نافذة
+# الأيام القادمة، مع الحجوزات المؤقتة السارية. يُرسم منها تقويم الحجز بدون أي
+# استعلام: الكتابات المحلية تحدّث الخلايا المتأثرة فقط، وتغييرات العمليات الأخرى
+# تُكتشف عبر PRAGMA data_version في refresh الدورية فتُعاد قراءة النافذة كاملة.
+# الشبكة للعرض فقط؛ الفحص الفعلي للسعة يبقى في place_hold.
+class OccupancyGrid:
+    def __init__(self, db, capacity, days):
+        self.db = db
+        self.capacity = capacity
+        self.days = days
+        self.first_day = None
+        self._booked = {}
+        self._holds = {}
+        self._data_version = None
+
+    def window(self, today):
+        return [(today + timedelta(days=offset)).isoformat() for offset in range(self.days)]
+
+    def _snapshot(self, conn, first, last):
+        version = conn.execute("PRAGMA data_version").fetchone()[0]
+        booked = conn.execute(WINDOW_OCCUPANCY_SQL, (json.dumps(list(self.capacity)), first, last)).fetchall()
+        holds = conn.execute(ACTIVE_HOLDS_SQL, (time.time(),)).fetchall()
+        return version, booked, holds
+
+    async def load(self, today):
+        days = self.window(today)
+        version, booked, holds = await self.db.run(self._snapshot, days[0], days[-1])
+        self._booked = {(location, day): people for location, day, people in booked}
+        self._holds = {user_id: (location, day, people, expires_at)
+                       for user_id, location, day, people, expires_at in holds}
+        self._data_version = version
+        self.first_day = today
+
+    async def ensure(self, today):
+        # قبل الرسم: تحميل أول مرة أو عند انتقال النافذة إلى يوم جديد فقط
+        if self.first_day != today:
+            await self.load(today)
+
+    async def refresh(self, today):
+        if self.first_day != today:
+            await self.load(today)
+            return True
+        version = (await self.db.fetchone("PRAGMA data_version"))[0]
+        if version != self._data_version:
+            await self.load(today)
+            return True
+        return False
+
+    # --- تحديثات الكتابات المحلية ---
+    def apply(self, cells):
+        self._booked.update(cells)
+
+    def hold(self, user_id, location, booking_date, people, expires_at):
+        self._holds[user_id] = (location, booking_date, people, expires_at)
+
+    def release(self, user_id):
+        self._holds.pop(user_id, None)
+
+    # --- القراءة ---
+    def remaining(self, location, booking_date, user_id=None, now=None):
+        now = time.time() if now is None else now
+        held = sum(people for holder, (hold_location, day, people, expires_at) in self._holds.items()
+                   if hold_location == location and day == booking_date and expires_at > now and holder != user_id)
+        return self.capacity[location] - self._booked.get((location, booking_date), 0) - held
+
+    def calendar(self, location, user_id=None):
+        if self.first_day is None:
+            return []
+        # مرور واحد على الحجوزات المؤقتة لكل الأيام بدل مرور لكل يوم
+        now = time.time()
+        held = {}
+        for holder, (hold_location, day, people, expires_at) in self._holds.items():
+            if hold_location == location and expires_at > now and holder != user_id:
+                held[day] = held.get(day, 0) + people
+        capacity = self.capacity[location]
+        return [(day, capacity - self._booked.get((location, day), 0) - held.get(day, 0))
+                for day in self.window(self.first_day)]
@@ -0,0 +1,231 @@
+import asyncio
+import json
+import time
+from collections import Counter
+from urllib.parse import parse_qsl, urlsplit
+
+
+# --- خادم وهمي لواجهة Bot API ---
+# بديل محلي لـ api.telegram.org للاختبارات وقياس الأداء: يجيب على getUpdates من
+# طابور داخلي، ويسجل كل طلب إرسال، ويضيف زمن استجابة اختيارياً لمحاكاة الشبكة.
+BOT_INFO = {
+    "id": 123456789,
+    "is_bot": True,
+    "first_name": "Bench",
+    "username": "bench_bot",
+    "can_join_groups": True,
+    "can_read_all_group_messages": False,
+    "supports_inline_queries": False,
+}
+
+
+def make_user(user_id):
+    return {"id": user_id, "is_bot": False, "first_name": f"user{user_id}", "username": f"user{user_id}"}
+
+
+def make_message_update(update_id, user_id, text, message_id=None):
+    message = {
+        "message_id": message_id or update_id,
+        "date": int(time.time()),
+        "chat": {"id": user_id, "type": "private", "first_name": f"user{user_id}"},
+        "from": make_user(user_id),
+        "text": text,
+    }
+    if text.startswith("/"):
+        message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+    return {"update_id": update_id, "message": message}
+
+
+def make_callback_update(update_id, user_id, data, message_id=1):
+    return {
+        "update_id": update_id,
+        "callback_query": {
+            "id": str(update_id),
+            "from": make_user(user_id),
+            "chat_instance": str(user_id),
+            "data": data,
+            "message": {
+                "message_id": message_id,
+                "date": int(time.time()),
+                "chat": {"id": user_id, "type": "private", "first_name": f"user{user_id}"},
+                "from": BOT_INFO,
+                "text": "...",
+            },
+        },
+    }
+
+
+class FakeBotAPI:
+    def __init__(self, latency=0.0, host="127.0.0.1", port=0):
+        self.latency = latency
+        self.host = host
+        self.port = port
+        self.calls = Counter()
+        self.sent = []
+        self.last_text = {}
+        self._updates = []
+        self._update_event = asyncio.Event()
+        self._message_id = 0
+        self._server = None
+
+    @property
+    def base_url(self):
+        return f"http://{self.host}:{self.port}/bot"
+
+    def push_updates(self, updates):
+        self._updates.extend(updates)
+        self._update_event.set()
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    @staticmethod
+    def _parse_params(headers, body):
+        if not body:
+            return {}
+        if headers.get("content-type", "").startswith("application/json"):
+            return json.loads(body)
+        params = {}
+        for key, value in parse_qsl(body.decode()):
+            try:
+                params[key] = json.loads(value)
+            except ValueError:
+                params[key] = value
+        return params
+
+    async def _get_updates(self, params):
+        offset = int(params.get("offset") or 0)
+        limit = int(params.get("limit") or 100)
+        timeout = float(params.get("timeout") or 0)
+        if offset:
+            self._updates = [u for u in self._updates if u["update_id"] >= offset]
+        if not self._updates and timeout:
+            self._update_event.clear()
+            try:
+                await asyncio.wait_for(self._update_event.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self._updates[:limit]
+
+    async def _call(self, method, params):
+        self.calls[method] += 1
+        if method == "getMe":
+            return BOT_INFO
+        if method == "getUpdates":
+            return await self._get_updates(params)
+        if method == "answerCallbackQuery":
+            return True
+        if method in ("sendMessage", "editMessageText", "sendDocument"):
+            self._message_id += 1
+            self.sent.append((method, params))
+            chat_id = params.get("chat_id") or 0
+            self.last_text[int(chat_id)] = params.get("text", "")
+            return {
+                "message_id": params.get("message_id") or self._message_id,
+                "date": int(time.time()),
+                "chat": {"id": int(chat_id), "type": "private"},
+                "from": BOT_INFO,
+                "text": params.get("text", ""),
+            }
+        return True
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                _, target, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length", 0))
+                body = await reader.readexactly(length) if length else b""
+
+                method = target.rsplit("/", 1)[-1]
+                result = await self._call(method, self._parse_params(headers, body))
+                if self.latency:
+                    await asyncio.sleep(self.latency)
+
+                payload = json.dumps({"ok": True, "result": result}).encode()
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                    + f"Content-Length: {len(payload)}\r\n\r\n".encode() + payload
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError, asyncio.CancelledError):
+            # CancelledError: getUpdates معلّق عند إيقاف الحلقة
+            pass
+        finally:
+            writer.close()
+
+
+# --- دافع تحديثات Webhook ---
+# يحاكي تيليغرام عند تسليم التحديثات إلى Webhook: عدة اتصالات keep-alive
+# متوازية (max_connections)، وكل طلب ينتظر ردّ الخادم قبل إرسال التالي.
+class WebhookPusher:
+    def __init__(self, url, secret_token=None, connections=40, latency=0.0):
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port
+        self.path = parts.path
+        self.secret_token = secret_token
+        self.connections = connections
+        self.latency = latency
+        self.delivered = 0
+
+    def _request(self, update):
+        body = json.dumps(update).encode()
+        headers = (
+            f"POST {self.path} HTTP/1.1\r\n"
+            f"Host: {self.host}:{self.port}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+        )
+        if self.secret_token:
+            headers += f"X-Telegram-Bot-Api-Secret-Token: {self.secret_token}\r\n"
+        return (headers + "\r\n").encode() + body
+
+    async def _connection(self, queue):
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        try:
+            while True:
+                update = await queue.get()
+                if update is None:
+                    break
+                if self.latency:
+                    await asyncio.sleep(self.latency)
+                writer.write(self._request(update))
+                await writer.drain()
+                status = await reader.readline()
+                length = 0
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b""):
+                        break
+                    if line.lower().startswith(b"content-length:"):
+                        length = int(line.split(b":", 1)[1])
+                await reader.readexactly(length)
+                if b" 200 " not in status:
+                    raise RuntimeError(status.decode().strip())
+                self.delivered += 1
+        finally:
+            writer.close()
+
+    async def push(self, updates):
+        queue = asyncio.Queue()
+        for update in updates:
+            queue.put_nowait(update)
+        for _ in range(self.connections):
+            queue.put_nowait(None)
+        await asyncio.gather(*(self._connection(queue) for _ in range(self.connections)))
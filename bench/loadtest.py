@@ -0,0 +1,300 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fake_bot_api import FakeBotAPI, make_callback_update, make_message_update  # noqa: E402
+from metrics import iter_handlers  # noqa: E402
+
+PAYMENT_CODE = re.compile(r"SHAM[0-9A-Z]{13}")
+FIRST_USER_ID = 100000
+FIRST_ADMIN_ID = 900000
+
+
+# --- اختبار الحمل ---
+# يشغّل Application الحقيقي من bot2.py (polling) ضد خادم Bot API الوهمي وقاعدة
+# بيانات جديدة في مجلد مؤقت. كل مستخدم افتراضي يمرّ بمسار الحجز كاملاً من
+# start_booking حتى get_transfer_number، ثم يوافق مسؤول على حجزه أو يرفضه.
+# النتائج: الإنتاجية، مئينات زمن كل معالج، وانتظار SQLite (طابور الاتصال
+# وزمن المعاملة). --output يكتبها JSON و --compare يقارنها بنتيجة سابقة (تقرير
+# فقط، إلا مع --fail-on-regression).
+def percentile(values, p):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+def summarize(values):
+    return {
+        "count": len(values),
+        "p50_ms": percentile(values, 50) * 1000,
+        "p95_ms": percentile(values, 95) * 1000,
+        "p99_ms": percentile(values, 99) * 1000,
+        "max_ms": max(values, default=0.0) * 1000,
+    }
+
+
+class Recorder:
+    def __init__(self):
+        self.handlers = defaultdict(list)
+        self.db_wait = defaultdict(list)
+        self.db_time = defaultdict(list)
+        self._waiters = {}
+
+    def expect(self, update_id):
+        future = asyncio.get_running_loop().create_future()
+        self._waiters[update_id] = future
+        return future
+
+    def handled(self, update, name, duration, result):
+        self.handlers[name].append(duration)
+        future = self._waiters.pop(getattr(update, "update_id", None), None)
+        if future is not None and not future.done():
+            future.set_result((name, result))
+
+    def db_observer(self, name):
+        def observe(wait, duration, ok):
+            self.db_wait[name].append(wait)
+            self.db_time[name].append(duration)
+        return observe
+
+
+def instrument(application, recorder):
+    def wrap(handler):
+        callback = handler.callback
+        name = callback.__name__
+
+        async def timed(update, context):
+            started = time.perf_counter()
+            result = None
+            try:
+                result = await callback(update, context)
+                return result
+            finally:
+                recorder.handled(update, name, time.perf_counter() - started, result)
+
+        handler.callback = timed
+
+    for handler in iter_handlers(application):
+        wrap(handler)
+
+
+class Driver:
+    def __init__(self, api, recorder, step_timeout):
+        self.api = api
+        self.recorder = recorder
+        self.step_timeout = step_timeout
+        self.update_id = 0
+        self.counts = defaultdict(int)
+
+    async def send(self, update):
+        handled = self.recorder.expect(update["update_id"])
+        self.api.push_updates([update])
+        return await asyncio.wait_for(handled, self.step_timeout)
+
+    def next_id(self):
+        self.update_id += 1
+        return self.update_id
+
+    async def text(self, user_id, text):
+        return await self.send(make_message_update(self.next_id(), user_id, text))
+
+    async def press(self, user_id, data):
+        return await self.send(make_callback_update(self.next_id(), user_id, data))
+
+    async def book(self, bot, user_id, admin_id, rng):
+        location = rng.choice(list(bot.CAPACITY))
+        booking_date = (date.today() + timedelta(days=rng.randint(1, 60))).isoformat()
+
+        await self.text(user_id, "📅 حجز طاولة")
+        await self.press(user_id, location)
+        await self.text(user_id, f"user{user_id}")
+        await self.text(user_id, str(rng.randint(1, 4)))
+        if (date.fromisoformat(booking_date) - date.today()).days < bot.CALENDAR_DAYS:
+            _, state = await self.press(user_id, f"day_{booking_date}")
+        else:
+            _, state = await self.text(user_id, booking_date)
+        if state != bot.CONFIRM:
+            self.counts["capacity_rejected"] += 1
+            await self.text(user_id, "/cancel")
+            return
+        await self.press(user_id, "confirm")
+        await self.text(user_id, str(rng.randint(10 ** 8, 10 ** 9)))
+
+        match = PAYMENT_CODE.search(self.api.last_text.get(user_id, ""))
+        if not match:
+            self.counts["not_saved"] += 1
+            return
+        self.counts["booked"] += 1
+
+        if rng.random() < 0.5:
+            await self.press(admin_id, f"approve_{match.group()}")
+            self.counts["approved"] += 1
+        else:
+            await self.text(admin_id, f"/reject_{match.group()}_load")
+            self.counts["rejected"] += 1
+
+
+async def run_load(args):
+    workdir = tempfile.mkdtemp(prefix="bot-load-")
+    api = FakeBotAPI(latency=args.latency)
+    await api.start()
+    os.environ.update(BOT_TOKEN="123456789:LOAD", BOT_API_URL=api.base_url, BOT_MODE="polling")
+    os.chdir(workdir)
+
+    import bot2
+    import webhook
+    from notifier import NotificationDispatcher
+
+    # سجل INFO لكل طلب HTTP يكلّف أكثر من المعالجات نفسها؛ --log-level INFO لقياس كلفة التسجيل
+    logging.getLogger().setLevel(args.log_level)
+    if not args.telegram_limits:
+        # الخادم الوهمي بلا حدود إرسال؛ حدود تيليغرام (1 رسالة/ثانية لكل دردشة) تجعل
+        # إشعارات المسؤولين تتراكم لدقائق بعد انتهاء الاختبار
+        bot2.notifier = NotificationDispatcher(global_rate=10 ** 6, per_chat_rate=10 ** 6, per_chat_burst=10 ** 6)
+
+    recorder = Recorder()
+    bot2.bookings_db.observer = recorder.db_observer("bookings")
+    bot2.admins_db.observer = recorder.db_observer("admins")
+    admin_ids = [FIRST_ADMIN_ID + i for i in range(args.admins)]
+    for admin_id in admin_ids:
+        bot2.admins_db.run_sync(lambda conn, a=admin_id: conn.execute(
+            "INSERT INTO admins (user_id, username, full_name, added_at) VALUES (?, ?, ?, ?)",
+            (str(a), f"admin{a}", f"admin{a}", bot2.get_current_time())))
+
+    application = bot2.build_application()
+    instrument(application, recorder)
+    await webhook.start_application(application)
+    await application.updater.start_polling(poll_interval=0, timeout=10)
+
+    driver = Driver(api, recorder, args.step_timeout)
+    rng = random.Random(args.seed)
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def user_session(index):
+        async with semaphore:
+            try:
+                await driver.book(bot2, FIRST_USER_ID + index, admin_ids[index % len(admin_ids)], rng)
+            except asyncio.TimeoutError:
+                driver.counts["timed_out"] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(user_session(i) for i in range(args.users)))
+    elapsed = time.perf_counter() - started
+    outbox_backlog = (await bot2.bookings_db.fetchone("SELECT COUNT(*) FROM outbox"))[0]
+
+    await application.updater.stop()
+    await webhook.stop_application(application)
+    bot2.close_databases()
+    await api.stop()
+    os.chdir(ROOT)
+    shutil.rmtree(workdir, ignore_errors=True)
+
+    handled = sum(len(v) for v in recorder.handlers.values())
+    return {
+        "commit": git_commit(),
+        "params": {key: value for key, value in vars(args).items()
+                   if key not in ("output", "compare", "fail_on_regression")},
+        "elapsed_s": elapsed,
+        "flows_per_s": driver.counts["booked"] / elapsed,
+        "updates_per_s": handled / elapsed,
+        "outcomes": dict(driver.counts),
+        "outbox_backlog": outbox_backlog,
+        "api_calls": dict(api.calls),
+        "handlers": {name: summarize(values) for name, values in sorted(recorder.handlers.items())},
+        "db_wait": {name: summarize(values) for name, values in recorder.db_wait.items()},
+        "db_transaction": {name: summarize(values) for name, values in recorder.db_time.items()},
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(result):
+    print(f"commit {result['commit']}: {result['params']['users']} users in {result['elapsed_s']:.2f}s")
+    print(f"  {result['flows_per_s']:,.1f} bookings/s, {result['updates_per_s']:,.1f} updates/s")
+    print(f"  outcomes: {result['outcomes']}, outbox backlog at end: {result['outbox_backlog']}")
+    rows = [("handler", result["handlers"])] + [(f"db wait: {k}", {k: v}) for k, v in result["db_wait"].items()]
+    rows += [(f"db txn: {k}", {k: v}) for k, v in result["db_transaction"].items()]
+    print(f"  {'':<28}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for title, table in rows:
+        for name, s in table.items():
+            label = name if title == "handler" else title
+            print(f"  {label:<28}{s['count']:>8}{s['p50_ms']:>10.2f}{s['p95_ms']:>10.2f}"
+                  f"{s['p99_ms']:>10.2f}{s['max_ms']:>10.2f}")
+
+
+def compare(result, baseline, tolerance, floor_ms):
+    # تراجع = إنتاجية أقل من الأساس بأكثر من tolerance، أو p95 لمعالج أبطأ بأكثر
+    # من tolerance (مع تجاهل الفروق تحت floor_ms لأنها ضجيج قياس)
+    regressions = []
+    if result["flows_per_s"] < baseline["flows_per_s"] * (1 - tolerance):
+        regressions.append(f"throughput {result['flows_per_s']:.1f}/s < baseline {baseline['flows_per_s']:.1f}/s")
+    for name, stats in result["handlers"].items():
+        before = baseline["handlers"].get(name)
+        if before is None:
+            continue
+        if stats["p95_ms"] > before["p95_ms"] * (1 + tolerance) and stats["p95_ms"] - before["p95_ms"] > floor_ms:
+            regressions.append(f"{name} p95 {stats['p95_ms']:.2f}ms > baseline {before['p95_ms']:.2f}ms")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=200, help="عدد المستخدمين النشطين في الوقت نفسه")
+    parser.add_argument("--admins", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.0, help="زمن الرحلة لكل طلب إلى Bot API بالثواني")
+    parser.add_argument("--telegram-limits", action="store_true", help="إبقاء حدود الإرسال الفعلية للإشعارات")
+    parser.add_argument("--step-timeout", type=float, default=30.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--output", help="كتابة النتائج بصيغة JSON")
+    parser.add_argument("--compare", help="ملف JSON لنتيجة سابقة للمقارنة")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--floor-ms", type=float, default=2.0)
+    parser.add_argument("--fail-on-regression", action="store_true",
+                        help="إنهاء بخطأ عند التراجع؛ بدونه المقارنة تقرير فقط")
+    args = parser.parse_args()
+
+    result = asyncio.run(run_load(args))
+    print_report(result)
+    if args.output:
+        with open(os.path.join(ROOT, args.output) if not os.path.isabs(args.output) else args.output, "w") as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+
+    if args.compare:
+        path = os.path.join(ROOT, args.compare) if not os.path.isabs(args.compare) else args.compare
+        with open(path) as f:
+            baseline = json.load(f)
+        regressions = compare(result, baseline, args.tolerance, args.floor_ms)
+        print(f"compared with {baseline.get('commit')}: "
+              f"{'no regressions' if not regressions else str(len(regressions)) + ' regression(s)'}")
+        for line in regressions:
+            print(f"  {line}")
+        if regressions and args.fail_on_regression:
+            return 1
+    return 1 if result["outcomes"].get("timed_out") else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
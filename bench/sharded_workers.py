@@ -0,0 +1,104 @@
+import argparse
+import asyncio
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_bot_api import FakeBotAPI, WebhookPusher, make_message_update  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SECRET = "bench-secret"
+
+
+# --- قياس التوسع بعدد العمال ---
+# يشغّل bot2.py فعلياً في وضع Webhook مع BOT_WORKERS = 1, 2, 4 ... وقاعدة بيانات
+# جديدة في مجلد مؤقت، ويدفع نفس أوامر /start من مستخدمين مختلفين، ثم يقيس الزمن
+# حتى يستقبل خادم Bot API الوهمي ردّاً على كل تحديث.
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def wait_ready(port, proc, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"bot2.py exited with {proc.returncode}")
+        try:
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(b"GET /healthz HTTP/1.1\r\nConnection: close\r\n\r\n")
+            await writer.drain()
+            await reader.read()
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.1)
+    raise TimeoutError("bot did not start")
+
+
+async def run_once(workers, updates, latency, connections):
+    api = FakeBotAPI(latency=latency)
+    await api.start()
+    port = free_port()
+    env = dict(
+        os.environ,
+        PYTHONPATH=ROOT,
+        BOT_TOKEN="123456789:BENCH",
+        BOT_API_URL=api.base_url,
+        BOT_MODE="webhook",
+        BOT_WORKERS=str(workers),
+        WEBHOOK_URL=f"http://127.0.0.1:{port}/telegram",
+        WEBHOOK_SECRET=SECRET,
+        WEBHOOK_LISTEN="127.0.0.1",
+        WEBHOOK_PORT=str(port),
+    )
+    with tempfile.TemporaryDirectory() as workdir, open(os.path.join(workdir, "bot.log"), "w") as log:
+        proc = subprocess.Popen([sys.executable, os.path.join(ROOT, "bot2.py")], cwd=workdir, env=env,
+                                stdout=log, stderr=subprocess.STDOUT)
+        try:
+            await wait_ready(port, proc)
+            baseline = api.calls["sendMessage"]
+            pusher = WebhookPusher(f"http://127.0.0.1:{port}/telegram", SECRET, connections)
+
+            started = time.perf_counter()
+            await pusher.push(updates)
+            while api.calls["sendMessage"] - baseline < len(updates):
+                if proc.poll() is not None:
+                    raise RuntimeError(f"bot2.py exited with {proc.returncode}")
+                await asyncio.sleep(0.005)
+            elapsed = time.perf_counter() - started
+        finally:
+            proc.send_signal(signal.SIGTERM)
+            await asyncio.get_running_loop().run_in_executor(None, proc.wait)
+            await api.stop()
+    return elapsed
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--updates", type=int, default=2000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--latency", type=float, default=0.02, help="زمن الرحلة لكل طلب إلى Bot API بالثواني")
+    parser.add_argument("--connections", type=int, default=100, help="max_connections في setWebhook")
+    args = parser.parse_args()
+
+    updates = [make_message_update(i + 1, 1000 + i % args.users, "/start") for i in range(args.updates)]
+    print(f"{os.cpu_count()} CPU(s), {args.updates} updates from {args.users} users, latency {args.latency}s")
+    base_rate = None
+    for workers in args.workers:
+        elapsed = await run_once(workers, updates, args.latency, args.connections)
+        rate = len(updates) / elapsed
+        base_rate = base_rate or rate
+        print(f"workers={workers}: {elapsed:.2f}s ({rate:,.0f} updates/s, {rate / base_rate:.2f}x)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
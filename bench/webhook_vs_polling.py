@@ -0,0 +1,121 @@
+import argparse
+import asyncio
+import multiprocessing
+import os
+import sys
+import time
+
+from telegram.ext import Application
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_bot_api import FakeBotAPI, WebhookPusher, make_message_update  # noqa: E402
+from webhook import WebhookServer  # noqa: E402
+
+TOKEN = "123456789:BENCH"
+SECRET = "bench-secret"
+
+
+# --- مقارنة استقبال التحديثات: Webhook مقابل Polling ---
+# "تيليغرام" (الخادم الوهمي أو دافع Webhook) يعمل في عملية منفصلة، ويُرسل نفس
+# التحديثات المسجلة بالطريقتين؛ يُقاس الزمن حتى تصل جميعها إلى
+# Application.update_queue. --latency يضيف زمن الرحلة لكل طلب HTTP.
+# تقرير فقط: النسبة تتغير مع الجهاز وزمن الرحلة، وصحة الاستقبال في tests/test_webhook.py.
+def recorded_updates(count, users):
+    return [make_message_update(i + 1, 1000 + i % users, "📅 حجز طاولة") for i in range(count)]
+
+
+def telegram_process(mode, updates, latency, connections, control):
+    async def run():
+        if mode == "polling":
+            api = FakeBotAPI(latency=latency)
+            await api.start()
+            control.send(api.base_url)
+            await asyncio.get_running_loop().run_in_executor(None, control.recv)
+            api.push_updates(updates)
+            await asyncio.get_running_loop().run_in_executor(None, control.recv)
+            control.send(api.calls["getUpdates"])
+            # الخادم يبقى حتى يوقف الطرف الآخر Updater، وإلا فشل آخر getUpdates معلق
+            await asyncio.get_running_loop().run_in_executor(None, control.recv)
+            await api.stop()
+        else:
+            url = await asyncio.get_running_loop().run_in_executor(None, control.recv)
+            pusher = WebhookPusher(url, SECRET, connections, latency)
+            await pusher.push(updates)
+            control.send(pusher.delivered)
+
+    asyncio.run(run())
+
+
+async def wait_for_queue(application, count):
+    while application.update_queue.qsize() < count:
+        await asyncio.sleep(0.001)
+
+
+async def bench_polling(updates, latency):
+    control, child_end = multiprocessing.Pipe()
+    child = multiprocessing.Process(target=telegram_process, args=("polling", updates, latency, 0, child_end))
+    child.start()
+    base_url = control.recv()
+
+    application = Application.builder().token(TOKEN).base_url(base_url).build()
+    await application.initialize()
+    await application.updater.start_polling(poll_interval=0, timeout=10)
+
+    started = time.perf_counter()
+    control.send("go")
+    await wait_for_queue(application, len(updates))
+    elapsed = time.perf_counter() - started
+
+    control.send("done")
+    requests = control.recv()
+    await application.updater.stop()
+    await application.shutdown()
+    control.send("stop")
+    child.join()
+    return elapsed, requests
+
+
+async def bench_webhook(updates, latency, connections):
+    application = Application.builder().token(TOKEN).updater(None).build()
+    server = WebhookServer(application, "telegram", secret_token=SECRET, listen="127.0.0.1", port=0)
+    await server.start()
+
+    control, child_end = multiprocessing.Pipe()
+    child = multiprocessing.Process(target=telegram_process,
+                                    args=("webhook", updates, latency, connections, child_end))
+    child.start()
+
+    started = time.perf_counter()
+    control.send(f"http://127.0.0.1:{server.port}/telegram")
+    await wait_for_queue(application, len(updates))
+    elapsed = time.perf_counter() - started
+
+    delivered = await asyncio.get_running_loop().run_in_executor(None, control.recv)
+    child.join()
+    await server.stop()
+    return elapsed, delivered
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--updates", type=int, default=5000)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.05, help="زمن الرحلة لكل طلب HTTP بالثواني")
+    parser.add_argument("--connections", type=int, default=100, help="max_connections في setWebhook")
+    args = parser.parse_args()
+
+    updates = recorded_updates(args.updates, args.users)
+    polling_time, polls = await bench_polling(updates, args.latency)
+    webhook_time, delivered = await bench_webhook(updates, args.latency, args.connections)
+
+    polling_rate = len(updates) / polling_time
+    webhook_rate = len(updates) / webhook_time
+    print(f"polling: {len(updates)} updates in {polling_time:.2f}s ({polling_rate:,.0f} updates/s, {polls} getUpdates)")
+    print(f"webhook: {delivered} updates in {webhook_time:.2f}s ({webhook_rate:,.0f} updates/s, "
+          f"{args.connections} connections)")
+    print(f"speedup: {webhook_rate / polling_rate:.2f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,10 +1,16 @@
 ﻿import pytz
+import asyncio
+import html
+import json
 import logging
+import os
 import sqlite3
-from datetime import datetime
+import sys
+import time
+import unicodedata
+from datetime import date, datetime, timedelta
 from telegram import (
     Update,
-    ReplyKeyboardMarkup,
     InlineKeyboardMarkup,
     InlineKeyboardButton
 )
@@ -15,19 +21,58 @@ from telegram.ext import (
     CallbackQueryHandler,
     ConversationHandler,
     ContextTypes,
+    TypeHandler,
     filters
 )
 
+from admin_registry import AdminRegistry
+import availability
+import export
+import log_queue
+import migrations
+import metrics
+import outbox
+import ui
+import webhook
+import workers
+from notifier import NotificationDispatcher
+from payment_codes import PaymentCodeGenerator
+from persistence import SQLitePersistence
+from storage import Database
+
 # --- إعدادات التسجيل ---
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
-)
+# السجلات تمر عبر طابور إلى خيط كتابة منفصل فلا تكتب حلقة الأحداث إلى المجرى بنفسها.
+# LOG_FORMAT=json لسجلات منظمة (مع handler و user_id و latency_ms)، و LOG_SAMPLE_EVERY
+# لعدد سطور INFO من httpx و telegram و apscheduler مقابل كل سطر يُكتب.
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO")
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "text")  # text | json
+LOG_SAMPLE_EVERY = int(os.environ.get("LOG_SAMPLE_EVERY", "100"))
+SLOW_HANDLER_MS = int(os.environ.get("SLOW_HANDLER_MS", "500"))
+
+log_queue.setup_logging(LOG_LEVEL, LOG_FORMAT, LOG_SAMPLE_EVERY)
 logger = logging.getLogger(__name__)
 
+# --- إعدادات التشغيل ---
+BOT_TOKEN = os.environ.get("BOT_TOKEN", "7992401524:AAEIKl5ECMeIl24bRlw3A3_2j_0Uvae0yLQ")
+BOT_API_URL = os.environ.get("BOT_API_URL", "https://api.telegram.org/bot")
+BOT_MODE = os.environ.get("BOT_MODE", "polling")  # polling | webhook
+WEBHOOK_URL = os.environ.get("WEBHOOK_URL", "")
+WEBHOOK_PATH = os.environ.get("WEBHOOK_PATH", "telegram")
+WEBHOOK_SECRET = os.environ.get("WEBHOOK_SECRET")
+WEBHOOK_LISTEN = os.environ.get("WEBHOOK_LISTEN", "0.0.0.0")
+WEBHOOK_PORT = int(os.environ.get("WEBHOOK_PORT", "8443"))
+WEBHOOK_MAX_CONNECTIONS = int(os.environ.get("WEBHOOK_MAX_CONNECTIONS", "100"))
+BOT_WORKERS = int(os.environ.get("BOT_WORKERS", "1"))  # أكثر من 1: موجّه + عمليات عمال حسب المستخدم
+
 # --- تعريف مراحل المحادثة ---
 LOCATION, NAME, PEOPLE, BOOKING_DATE, CONFIRM, TRANSFER_NUMBER = range(6)
 
+# --- نتائج تسجيل الحجز ---
+BOOKING_SAVED, TRANSFER_REUSED, BOOKING_NOT_SAVED = range(3)
+
+# --- نتائج الموافقة على حجز أو رفضه ---
+BOOKING_MODERATED, ALREADY_PROCESSED, BOOKING_NOT_FOUND = range(3)
+
 # --- إعدادات المنطقة الزمنية ---
 TIMEZONE = pytz.timezone('Asia/Damascus')
 
@@ -40,48 +85,94 @@ CAPACITY = {
     "hall_side": 45
 }
 
+# --- مدة الحجز المؤقت للمقاعد أثناء المحادثة (بالثواني) ---
+HOLD_TTL = 15 * 60
+
+# --- تقويم الحجز: عدد الأيام المعروضة والفاصل الزمني لمزامنة شبكة الإشغال (بالثواني) ---
+CALENDAR_DAYS = 14
+AVAILABILITY_REFRESH_INTERVAL = 5
+
 # --- إعدادات الدفع ---
 MERCHANT_PHONE = "0990330431"
 PRICE_PER_PERSON = 10000
 
+# --- عدد الحجوزات في كل صفحة من قوائم الحجوزات، وأقصى طول لنص الصفحة ---
+# (حد رسالة تيليغرام 4096 حرفاً، مع هامش لترويسة الرسالة)
+PAGE_SIZE = 10
+PAGE_MAX_CHARS = 3500
+
+# --- أقصى طول لاسم الحجز، ولأي نص يكتبه المستخدم عند عرضه في القوائم ---
+MAX_NAME_LENGTH = 64
+MAX_FIELD_CHARS = 100
+
 # --- إعدادات قاعدة البيانات ---
 DB_NAME = "bookings.db"
 ADMINS_DB = "admins.db"
 
+# --- المقاييس: زمن المعالجات وطلبات Bot API ومعاملات SQLite ---
+bot_metrics = metrics.Metrics()
+
+bookings_db = Database(DB_NAME, observer=bot_metrics.db_observer("bookings"))
+admins_db = Database(ADMINS_DB, observer=bot_metrics.db_observer("admins"))
+admin_registry = AdminRegistry(admins_db)
+occupancy_grid = availability.OccupancyGrid(bookings_db, CAPACITY, CALENDAR_DAYS)
+
+# --- الفاصل الزمني لمزامنة المسؤولين مع تغييرات العمليات الأخرى (بالثواني) ---
+ADMIN_REFRESH_INTERVAL = 10
+
+payment_codes = PaymentCodeGenerator()
+notifier = NotificationDispatcher()
+
+# --- عدد نتائج البحث المعروضة في /find ---
+FIND_LIMIT = 10
+
+# --- أقصى طول لتقرير أرقام التحويل المكررة في /transfers ---
+TRANSFER_AUDIT_MAX_CHARS = 3800
+
+# --- حد حجم الملفات التي يقبلها Bot API للإرسال (50 ميغابايت) ---
+EXPORT_MAX_BYTES = 50 * 1024 * 1024
+
+# --- الفاصل الزمني لحفظ حالة المحادثات (بالثواني) ---
+PERSISTENCE_INTERVAL = 10
+
+# --- الفاصل الزمني لتفريغ صندوق الصادر (بالثواني) ---
+OUTBOX_POLL_INTERVAL = 5
+
+# --- المهام المجدولة: الفاصل الزمني (بالثواني) وعدد الحجوزات في كل معاملة ---
+SCHEDULER_INTERVAL = 5 * 60
+SCHEDULER_CHUNK = 200
+
+# --- تذكير الضيوف بحجز الغد ابتداءً من هذه الساعة (بتوقيت دمشق) ---
+REMINDER_HOUR = 18
+
+# --- تذكير المسؤولين بالحجوزات المعلقة: أقل فاصل بين تذكيرين (بالثواني) وعدد الأقدم المعروضة ---
+ADMIN_NUDGE_INTERVAL = 3 * 60 * 60
+ADMIN_NUDGE_OLDEST = 5
+
+EXPIRED_REASON = "انتهى موعد الحجز دون موافقة"
+
+# --- أبعد تاريخ يمكن الحجز فيه (بالأيام من اليوم) ---
+MAX_BOOKING_DAYS_AHEAD = 90
+
+# --- أرشفة الحجوزات: بعد كم يوم من تاريخ الحجز، وعدد الحجوزات المنقولة في كل معاملة ---
+ARCHIVE_AFTER_DAYS = 7
+ARCHIVE_CHUNK = 500
+
 
 # --- تهيئة قواعد البيانات ---
 def init_databases():
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute('''CREATE TABLE IF NOT EXISTS bookings
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                 payment_code TEXT UNIQUE,
-                 name TEXT,
-                 location TEXT,
-                 people INTEGER,
-                 amount INTEGER,
-                 transfer_number TEXT,
-                 status TEXT DEFAULT 'pending',
-                 user_id INTEGER,
-                 created_at TIMESTAMP,
-                 booking_date TEXT)''')
-    conn.commit()
-    conn.close()
-
-    conn = sqlite3.connect(ADMINS_DB)
-    c = conn.cursor()
-    c.execute('''CREATE TABLE IF NOT EXISTS admins
-                 (user_id TEXT PRIMARY KEY,
-                 username TEXT,
-                 full_name TEXT,
-                 added_at TIMESTAMP)''')
-    conn.commit()
-    conn.close()
+    bookings_db.run_sync(migrations.migrate_bookings)
+    admins_db.run_sync(migrations.migrate_admins)
 
 
 init_databases()
 
 
+def close_databases():
+    bookings_db.close()
+    admins_db.close()
+
+
 # --- الدوال المساعدة ---
 def get_current_date():
     return datetime.now(TIMEZONE).strftime('%Y-%m-%d')
@@ -91,65 +182,62 @@ def get_current_time():
     return datetime.now(TIMEZONE).strftime('%Y-%m-%d %H:%M:%S')
 
 
+def get_today():
+    return datetime.now(TIMEZONE).date()
+
+
+def booking_date_error(booking_day):
+    # التاريخ الماضي يرفضه run_scheduler تلقائياً بعد الدفع، فيُرفض هنا قبل الحجز المؤقت
+    today = get_today()
+    if booking_day < today:
+        return "⚠️ لا يمكن الحجز في تاريخ مضى. الرجاء اختيار تاريخ من اليوم فصاعداً"
+    if booking_day > today + timedelta(days=MAX_BOOKING_DAYS_AHEAD):
+        return f"⚠️ يمكن الحجز قبل {MAX_BOOKING_DAYS_AHEAD} يوماً على الأكثر. الرجاء اختيار تاريخ أقرب"
+    return None
+
+
 def is_admin(user_id):
-    conn = sqlite3.connect(ADMINS_DB)
-    c = conn.cursor()
-    c.execute("SELECT * FROM admins WHERE user_id=?", (str(user_id),))
-    result = c.fetchone()
-    conn.close()
-    return result is not None
+    return admin_registry.is_admin(user_id)
 
 
-def add_admin(user_id, username=None, full_name=None):
-    conn = sqlite3.connect(ADMINS_DB)
-    c = conn.cursor()
-    try:
-        c.execute("INSERT INTO admins (user_id, username, full_name, added_at) VALUES (?, ?, ?, ?)",
-                  (str(user_id), username, full_name, datetime.now()))
-        conn.commit()
-        return True
-    except sqlite3.IntegrityError:
-        return False
-    finally:
-        conn.close()
+async def is_admin_now(user_id):
+    # للأفعال التي تغيّر البيانات: نتحقق من data_version أولاً حتى لا يعمل
+    # عامل آخر بصلاحيات سُحبت قبل موعد refresh_admins التالي
+    await admin_registry.refresh()
+    return is_admin(user_id)
+
+
+async def add_admin(user_id, username=None, full_name=None):
+    return await admin_registry.add(user_id, username, full_name)
 
 
 def get_admin_info(user_id):
-    conn = sqlite3.connect(ADMINS_DB)
-    c = conn.cursor()
-    c.execute("SELECT username, full_name FROM admins WHERE user_id=?", (str(user_id),))
-    result = c.fetchone()
-    conn.close()
+    result = admin_registry.get(user_id)
     return {
-        "username": result[0] if result else None,
-        "full_name": result[1] if result else None
+        "username": result[1] if result else None,
+        "full_name": result[2] if result else None
     }
 
 
-def remove_admin(user_id):
-    conn = sqlite3.connect(ADMINS_DB)
-    c = conn.cursor()
-    c.execute("DELETE FROM admins WHERE user_id=?", (str(user_id),))
-    conn.commit()
-    rows_affected = c.rowcount
-    conn.close()
-    return rows_affected > 0
+async def remove_admin(user_id):
+    return await admin_registry.remove(user_id)
 
 
 def list_admins():
-    conn = sqlite3.connect(ADMINS_DB)
-    c = conn.cursor()
-    c.execute("SELECT * FROM admins")
-    admins = c.fetchall()
-    conn.close()
-    return admins
+    return admin_registry.all()
 
 
-async def notify_admins_new_booking(context: ContextTypes.DEFAULT_TYPE, booking_data):
-    admins = list_admins()
-    if not admins:
-        return
+async def refresh_admins(context: ContextTypes.DEFAULT_TYPE):
+    if await admin_registry.refresh():
+        logger.info("تم تحديث قائمة المسؤولين من قاعدة البيانات")
+
+
+async def refresh_availability(context: ContextTypes.DEFAULT_TYPE):
+    await occupancy_grid.refresh(get_today())
 
+
+# --- الإشعارات (تُرسل عبر صندوق الصادر) ---
+def render_new_booking_notification(booking_data):
     booking_details = (
         f"📣 حجز جديد يحتاج للموافقة:\n\n"
         f"🆔 كود الحجز: <code>{booking_data['payment_code']}</code>\n"
@@ -157,154 +245,673 @@ async def notify_admins_new_booking(context: ContextTypes.DEFAULT_TYPE, booking_
         f"📍 الموقع: {booking_data['location']}\n"
         f"👥 عدد الأشخاص: {booking_data['people']}\n"
         f"💰 المبلغ: {booking_data['amount']:,} ل.س\n"
+        f"🔢 رقم التحويل: {booking_data.get('transfer_number', '-')}\n"
         f"📅 تاريخ الحجز: {booking_data['booking_date']}\n"
         f"👤 معرف المستخدم: {booking_data['user_id']}\n"
     )
+    reused = booking_data.get('reused_by')
+    if reused:
+        booking_details += "\n⚠️ رقم التحويل مستخدم سابقاً في:\n" + "\n".join(
+            f"• <code>{code}</code> ({format_booking_status(status)})" for code, status in reused) + "\n"
 
     keyboard = InlineKeyboardMarkup([
         [InlineKeyboardButton("✅ الموافقة على الحجز", callback_data=f"approve_{booking_data['payment_code']}")]
     ])
+    return booking_details, keyboard
 
-    for admin in admins:
-        try:
-            await context.bot.send_message(
-                chat_id=admin[0],
-                text=booking_details,
-                reply_markup=keyboard
-            )
-        except Exception as e:
-            logger.error(f"فشل في إرسال إشعار للمسؤول {admin[0]}: {str(e)}")
-
-
-async def notify_user_approval(context: ContextTypes.DEFAULT_TYPE, payment_code):
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("SELECT user_id, name, booking_date FROM bookings WHERE payment_code=?", (payment_code,))
-    booking = c.fetchone()
-    conn.close()
-
-    if booking:
-        user_id, name, booking_date = booking
-        message = (
-            f"🎉 تمت الموافقة على حجزك!\n\n"
-            f"👤 الاسم: {name}\n"
-            f"🆔 كود الحجز: <code>{payment_code}</code>\n"
-            f"📅 تاريخ الحجز: {booking_date}\n\n"
-            "شكراً لثقتك بنا! نتمنى لك وقتاً ممتعاً."
-        )
 
-        try:
-            await context.bot.send_message(
-                chat_id=user_id,
-                text=message
-            )
-        except Exception as e:
-            logger.error(f"فشل في إرسال إشعار للمستخدم {user_id}: {str(e)}")
+def render_user_approval(booking_data):
+    message = (
+        f"🎉 تمت الموافقة على حجزك!\n\n"
+        f"👤 الاسم: {booking_data['name']}\n"
+        f"🆔 كود الحجز: <code>{booking_data['payment_code']}</code>\n"
+        f"📅 تاريخ الحجز: {booking_data['booking_date']}\n\n"
+        "شكراً لثقتك بنا! نتمنى لك وقتاً ممتعاً."
+    )
+    return message, None
+
+
+def render_reminder(booking_data):
+    message = (
+        f"⏰ تذكير بحجزك غداً\n\n"
+        f"👤 الاسم: {booking_data['name']}\n"
+        f"🆔 كود الحجز: <code>{booking_data['payment_code']}</code>\n"
+        f"📍 الموقع: {ui.LOCATION_LABELS.get(booking_data['location'], booking_data['location'])}\n"
+        f"👥 عدد الأشخاص: {booking_data['people']}\n"
+        f"📅 تاريخ الحجز: {booking_data['booking_date']}\n\n"
+        "بانتظارك في واحة الشام!"
+    )
+    return message, None
 
 
-def save_booking(data, context: ContextTypes.DEFAULT_TYPE):
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
+def render_pending_nudge(summary):
+    message = f"⏳ {summary['pending']} حجز بانتظار الموافقة. الأقدم:\n\n" + "".join(
+        f"• <code>{code}</code> - {name} - {booking_date}\n" for code, name, booking_date in summary['oldest'])
+    return message + "\nاستخدم /admin للمراجعة", None
+
+
+NOTIFICATION_RENDERERS = {
+    "new_booking": render_new_booking_notification,
+    "approval": render_user_approval,
+    "reminder": render_reminder,
+    "pending_nudge": render_pending_nudge,
+}
+
+
+async def deliver_notification(bot, chat_id, kind, payload):
+    text, keyboard = NOTIFICATION_RENDERERS[kind](payload)
+    return await notifier.send_message(bot, chat_id, text, reply_markup=keyboard)
+
+
+notification_outbox = outbox.Outbox(bookings_db, deliver_notification)
+
+
+async def drain_outbox(context: ContextTypes.DEFAULT_TYPE):
+    delivered, failed = await notification_outbox.drain(context.bot)
+    if failed:
+        logger.error(f"صندوق الصادر: وصل {delivered} إشعار وفشل {failed}")
+
+
+def wake_outbox(context: ContextTypes.DEFAULT_TYPE):
+    context.job_queue.run_once(drain_outbox, 0)
+
+
+# --- سجل أرقام التحويل ---
+# رقم التحويل يُقبل مرة واحدة: لا يُسجَّل حجز برقم مستخدم في حجز معلق أو موافق عليه.
+# الشرط جزء من عبارة INSERT نفسها (بحث على idx_bookings_transfer)، فلا يمر طلبان
+# متزامنان بنفس الرقم. الرقم المستخدم في حجوزات مرفوضة فقط يُقبل ويُعلَّم للمسؤولين.
+def normalize_transfer_number(text):
+    # الأرقام العربية-الهندية وغيرها تُحوَّل إلى 0-9 حتى لا يتجاوز الرقم نفسه الفحص بكتابة مختلفة
+    text = text.strip()
+    if not text.isdigit():
+        return None
+    return "".join(str(unicodedata.digit(ch)) for ch in text)
+
+
+_SAVE_BOOKING_SQL = '''
+    INSERT INTO bookings
+        (payment_code, name, location, people, amount, transfer_number, user_id, created_at, booking_date)
+    SELECT :payment_code, :name, location, people, :amount, :transfer_number, user_id, :created_at, booking_date
+    FROM seat_holds WHERE user_id = :user_id AND expires_at > :now
+    AND NOT EXISTS (SELECT 1 FROM bookings WHERE transfer_number = :transfer_number
+                    AND status NOT LIKE 'rejected%')
+    AND NOT EXISTS (SELECT 1 FROM bookings_archive WHERE transfer_number = :transfer_number
+                    AND status NOT LIKE 'rejected%')
+'''
+
+# الاستخدامات السابقة للرقم في الجدول الساخن والأرشيف، الأقدم أولاً
+_TRANSFER_USES_SQL = '''
+    SELECT payment_code, status, id FROM bookings WHERE transfer_number = :transfer_number
+    AND payment_code != :payment_code
+    UNION ALL
+    SELECT payment_code, status, id FROM bookings_archive WHERE transfer_number = :transfer_number
+    ORDER BY 3
+'''
+
+
+async def save_booking(data, context: ContextTypes.DEFAULT_TYPE):
+    # تحويل الحجز المؤقت للمستخدم إلى حجز فعلي ضمن معاملة واحدة
+    def _convert_hold(conn):
+        c = conn.cursor()
+        c.execute(_SAVE_BOOKING_SQL, {
+            "payment_code": data['payment_code'],
+            "name": data['name'],
+            "amount": data['amount'],
+            "transfer_number": data['transfer_number'],
+            "created_at": datetime.now(),
+            "user_id": data['user_id'],
+            "now": time.time(),
+        })
+        inserted = c.rowcount
+        previous = [row[:2] for row in c.execute(_TRANSFER_USES_SQL, {
+            "transfer_number": data['transfer_number'], "payment_code": data['payment_code']})]
+        if not inserted:
+            if any(not status.startswith('rejected') for _, status in previous):
+                # الحجز المؤقت يبقى حتى يصحح المستخدم الرقم
+                return TRANSFER_REUSED, previous, {}
+            c.execute("DELETE FROM seat_holds WHERE user_id=?", (data['user_id'],))
+            return BOOKING_NOT_SAVED, previous, {}
+
+        c.execute("DELETE FROM seat_holds WHERE user_id=?", (data['user_id'],))
+        cells = availability.read_cells(conn, [(data['location'], data['booking_date'])])
+        payload = {key: data[key] for key in
+                   ('payment_code', 'name', 'location', 'people', 'amount', 'transfer_number', 'booking_date',
+                    'user_id')}
+        payload['reused_by'] = previous
+        for admin in list_admins():
+            outbox.enqueue(conn, admin[0], "new_booking", payload)
+        return BOOKING_SAVED, previous, cells
+
     try:
-        c.execute('''INSERT INTO bookings 
-                    (payment_code, name, location, people, amount, transfer_number, user_id, created_at, booking_date)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-                  (data['payment_code'], data['name'], data['location'],
-                   data['people'], data['amount'], data['transfer_number'],
-                   data['user_id'], datetime.now(), data['booking_date']))
-        conn.commit()
-
-        # إرسال إشعار للمسؤولين
-        context.application.create_task(notify_admins_new_booking(context, data))
-
-        return True
+        result, previous, cells = await bookings_db.run(_convert_hold)
     except sqlite3.IntegrityError:
         logger.error("كود الدفع موجود مسبقاً")
+        return BOOKING_NOT_SAVED
+
+    if result != TRANSFER_REUSED:
+        occupancy_grid.release(data['user_id'])
+        occupancy_grid.apply(cells)
+    if result == TRANSFER_REUSED:
+        logger.warning(f"رقم التحويل {data['transfer_number']} مستخدم في {', '.join(code for code, _ in previous)}")
+        return result
+    if result == BOOKING_NOT_SAVED:
+        logger.error(f"لا يوجد حجز مؤقت ساري للمستخدم {data['user_id']}")
+        return result
+
+    # إرسال إشعار للمسؤولين
+    wake_outbox(context)
+    return result
+
+
+# --- البحث في الحجوزات (/find) ---
+# مطابقة على فهرس FTS5 (bookings_fts) ثم جلب الحجوزات بالمفتاح الأساسي، الأحدث أولاً:
+# ترتيب rowid يسمح لـ FTS5 بالتوقف بعد أول FIND_LIMIT نتيجة بدل ترتيب كل المطابقات.
+# الفهرس يحتفظ بالحجوزات المؤرشفة أيضاً، فتُجلب من الجدولين (العمود الأخير: مؤرشف).
+_FIND_SQL = '''
+    SELECT id, payment_code, name, location, people, amount, transfer_number, status, user_id, created_at,
+           booking_date, reject_reason, reminded_at, 0 FROM bookings
+    WHERE id IN (SELECT rowid FROM bookings_fts WHERE bookings_fts MATCH :match ORDER BY rowid DESC LIMIT :limit)
+    UNION ALL
+    SELECT id, payment_code, name, location, people, amount, transfer_number, status, user_id, created_at,
+           booking_date, reject_reason, reminded_at, 1 FROM bookings_archive
+    WHERE id IN (SELECT rowid FROM bookings_fts WHERE bookings_fts MATCH :match ORDER BY rowid DESC LIMIT :limit)
+    ORDER BY 1 DESC
+'''
+
+
+def build_search_query(text):
+    # كل كلمة عبارة بين علامتي تنصيص فلا تُفسَّر كعوامل FTS5، والكلمات كلها مطلوبة معاً.
+    # مقسِّم trigram لا يطابق أقل من 3 أحرف.
+    terms = [word for word in text.split() if len(word) >= 3]
+    return " ".join('"' + word.replace('"', '""') + '"' for word in terms) or None
+
+
+async def search_bookings(text, limit=FIND_LIMIT):
+    match = build_search_query(text)
+    if match is None:
+        return None
+    return await bookings_db.fetchall(_FIND_SQL, {"match": match, "limit": limit + 1})
+
+
+# مرور واحد مرتب على فهرس رقم التحويل في كل جدول يجد الأرقام المكررة داخله، ومرور على
+# فهرس الجدول الساخن مع بحث في فهرس الأرشيف يجد الأرقام المشتركة بينهما. بعدها تُجلب
+# تفاصيل حجوزات هذه الأرقام فقط بالبحث على الفهرسين.
+_DUPLICATE_NUMBERS_SQL = (
+    "SELECT transfer_number FROM bookings WHERE transfer_number > '' "
+    "GROUP BY transfer_number HAVING COUNT(*) > 1",
+    "SELECT transfer_number FROM bookings_archive WHERE transfer_number > '' "
+    "GROUP BY transfer_number HAVING COUNT(*) > 1",
+    "SELECT DISTINCT transfer_number FROM bookings WHERE transfer_number > '' "
+    "AND EXISTS (SELECT 1 FROM bookings_archive a WHERE a.transfer_number = bookings.transfer_number)",
+)
+_TRANSFER_DETAILS_SQL = '''
+    SELECT transfer_number, payment_code, status, user_id, booking_date, id FROM bookings
+    WHERE transfer_number IN (SELECT value FROM json_each(:numbers))
+    UNION ALL
+    SELECT transfer_number, payment_code, status, user_id, booking_date, id FROM bookings_archive
+    WHERE transfer_number IN (SELECT value FROM json_each(:numbers))
+    ORDER BY 1, 6
+'''
+
+
+async def find_duplicate_transfers():
+    def _find(conn):
+        numbers = {row[0] for sql in _DUPLICATE_NUMBERS_SQL for row in conn.execute(sql)}
+        if not numbers:
+            return []
+        return conn.execute(_TRANSFER_DETAILS_SQL, {"numbers": json.dumps(sorted(numbers))}).fetchall()
+
+    groups = {}
+    for transfer_number, *booking, _ in await bookings_db.run(_find):
+        groups.setdefault(transfer_number, []).append(booking)
+    return groups
+
+
+async def approve_booking(payment_code):
+    # تغيير الحالة وإدراج إشعار المستخدم في صندوق الصادر ضمن معاملة واحدة. الحجوزات
+    # المعلقة فقط، كما في الموافقة الجماعية: الضغط مجدداً على زر موافقة قديم لا يرسل
+    # إشعاراً ثانياً، والحجز المرفوض لا يستعيد مقاعده دون فحص السعة.
+    def _approve(conn):
+        row = conn.execute("UPDATE bookings SET status='approved' WHERE payment_code=? AND +status='pending' "
+                           "RETURNING user_id, name, booking_date", (payment_code,)).fetchone()
+        if row is None:
+            exists = conn.execute("SELECT 1 FROM bookings WHERE payment_code=?", (payment_code,)).fetchone()
+            return ALREADY_PROCESSED if exists else BOOKING_NOT_FOUND
+        user_id, name, booking_date = row
+        outbox.enqueue(conn, user_id, "approval",
+                       {"payment_code": payment_code, "name": name, "booking_date": booking_date})
+        return BOOKING_MODERATED
+
+    return await bookings_db.run(_approve)
+
+
+async def reject_booking(payment_code, reason=None):
+    # الحجوزات المعلقة فقط، كما في الموافقة: زر رفض قديم لا يقلب حجزاً أُبلغ ضيفه
+    # بالموافقة إلى مرفوض ولا يحرر مقاعده
+    def _reject(conn):
+        rows = conn.execute(
+            "UPDATE bookings SET status=?, reject_reason=? WHERE payment_code=? AND +status='pending' "
+            "RETURNING location, booking_date",
+            (f'rejected: {reason}' if reason else 'rejected', reason, payment_code)).fetchall()
+        if not rows:
+            exists = conn.execute("SELECT 1 FROM bookings WHERE payment_code=?", (payment_code,)).fetchone()
+            return (ALREADY_PROCESSED if exists else BOOKING_NOT_FOUND), {}
+        return BOOKING_MODERATED, availability.read_cells(conn, rows)
+
+    result, cells = await bookings_db.run(_reject)
+    occupancy_grid.apply(cells)
+    return result
+
+
+# --- الإشراف الجماعي ---
+# موافقة أو رفض لعدة حجوزات في معاملة واحدة: عبارة UPDATE واحدة تعيد ما تغيّر فعلاً
+# (RETURNING)، ثم تُدرج إشعارات الموافقة دفعة واحدة في صندوق الصادر. لا تُعدَّل إلا
+# الحجوزات المعلقة، فلا يقلب إجراء جماعي حجزاً مرفوضاً إلى موافق عليه.
+# +status يمنع المخطط من تفضيل فهرس الحالة على فهرس payment_code الفريد.
+BULK_APPROVE = {
+    "codes": "UPDATE bookings SET status='approved' "
+             "WHERE payment_code IN (SELECT value FROM json_each(:codes)) AND +status='pending' "
+             "RETURNING payment_code, user_id, name, booking_date",
+    "date": "UPDATE bookings SET status='approved' WHERE status='pending' AND booking_date=:booking_date "
+            "RETURNING payment_code, user_id, name, booking_date",
+    "date_location": "UPDATE bookings SET status='approved' "
+                     "WHERE status='pending' AND booking_date=:booking_date AND location=:location "
+                     "RETURNING payment_code, user_id, name, booking_date",
+}
+BULK_REJECT = {
+    "codes": "UPDATE bookings SET status=:status, reject_reason=:reason "
+             "WHERE payment_code IN (SELECT value FROM json_each(:codes)) AND +status='pending' "
+             "RETURNING payment_code, location, booking_date",
+    "date": "UPDATE bookings SET status=:status, reject_reason=:reason "
+            "WHERE status='pending' AND booking_date=:booking_date RETURNING payment_code, location, booking_date",
+    "date_location": "UPDATE bookings SET status=:status, reject_reason=:reason "
+                     "WHERE status='pending' AND booking_date=:booking_date AND location=:location "
+                     "RETURNING payment_code, location, booking_date",
+}
+
+
+def _bulk_selector(codes=None, booking_date=None, location=None):
+    if codes is not None:
+        return "codes", {"codes": json.dumps(list(codes))}
+    if location:
+        return "date_location", {"booking_date": booking_date, "location": location}
+    return "date", {"booking_date": booking_date}
+
+
+async def approve_bookings(codes=None, booking_date=None, location=None):
+    key, params = _bulk_selector(codes, booking_date, location)
+
+    def _approve(conn):
+        rows = conn.execute(BULK_APPROVE[key], params).fetchall()
+        outbox.enqueue_many(conn, [
+            (user_id, "approval", {"payment_code": code, "name": name, "booking_date": day})
+            for code, user_id, name, day in rows
+        ])
+        return [row[0] for row in rows]
+
+    return await bookings_db.run(_approve)
+
+
+async def reject_bookings(reason=None, codes=None, booking_date=None, location=None):
+    key, params = _bulk_selector(codes, booking_date, location)
+    params.update(status=f'rejected: {reason}' if reason else 'rejected', reason=reason)
+
+    def _reject(conn):
+        rows = conn.execute(BULK_REJECT[key], params).fetchall()
+        return [row[0] for row in rows], availability.read_cells(conn, [row[1:] for row in rows])
+
+    codes, cells = await bookings_db.run(_reject)
+    occupancy_grid.apply(cells)
+    return codes
+
+
+# --- الإحصائيات من جدول الملخص booking_stats ---
+STATS_STATUSES = ('pending', 'approved', 'rejected')
+STATS_UPCOMING_DAYS = 14
+
+
+async def get_status_totals(status):
+    return await bookings_db.fetchone(
+        "SELECT IFNULL(SUM(bookings), 0), IFNULL(SUM(people), 0), IFNULL(SUM(amount), 0) "
+        "FROM booking_stats WHERE status=?", (status,))
+
+
+async def get_booking_stats(from_date):
+    def _stats(conn):
+        c = conn.cursor()
+        c.execute("SELECT status, SUM(bookings), SUM(people), SUM(amount) FROM booking_stats "
+                  "WHERE status IN ('pending', 'approved', 'rejected') GROUP BY status")
+        by_status = c.fetchall()
+        c.execute("SELECT location, SUM(bookings), SUM(people), SUM(amount) FROM booking_stats "
+                  "WHERE status IN ('pending', 'approved') GROUP BY location ORDER BY location")
+        by_location = c.fetchall()
+        c.execute("SELECT booking_date, SUM(bookings), SUM(people), SUM(amount) FROM booking_stats "
+                  "WHERE status IN ('pending', 'approved') AND booking_date >= ? "
+                  "GROUP BY booking_date ORDER BY booking_date LIMIT ?", (from_date, STATS_UPCOMING_DAYS))
+        by_date = c.fetchall()
+        return by_status, by_location, by_date
+
+    return await bookings_db.run(_stats)
+
+
+# --- تقسيم قوائم الحجوزات إلى صفحات (keyset pagination) ---
+# كل صفحة استعلام واحد يبدأ من آخر id معروض بدلاً من OFFSET،
+# فتبقى كلفته ثابتة مهما كبر الجدول.
+# لكل قائمة: (استعلام الصفحات الأقدم، استعلام الصفحات الأحدث)
+BOOKING_LISTS = {
+    "approved": ("SELECT * FROM bookings WHERE status='approved' AND id < ? ORDER BY id DESC LIMIT ?",
+                 "SELECT * FROM bookings WHERE status='approved' AND id > ? ORDER BY id ASC LIMIT ?"),
+    "pending": ("SELECT * FROM bookings WHERE status='pending' AND id < ? ORDER BY id DESC LIMIT ?",
+                "SELECT * FROM bookings WHERE status='pending' AND id > ? ORDER BY id ASC LIMIT ?"),
+    "mine": ("SELECT * FROM bookings WHERE user_id=? AND id < ? ORDER BY id DESC LIMIT ?",
+             "SELECT * FROM bookings WHERE user_id=? AND id > ? ORDER BY id ASC LIMIT ?"),
+}
+FIRST_PAGE_CURSOR = sys.maxsize
+
+
+async def get_bookings_page(list_name, params=(), older_than=None, newer_than=None, limit=PAGE_SIZE):
+    older_sql, newer_sql = BOOKING_LISTS[list_name]
+    if newer_than is not None:
+        rows = await bookings_db.fetchall(newer_sql, (*params, newer_than, limit + 1))
+        has_newer = len(rows) > limit
+        rows = rows[:limit][::-1]
+        has_older = True
+    else:
+        cursor = FIRST_PAGE_CURSOR if older_than is None else older_than
+        rows = await bookings_db.fetchall(older_sql, (*params, cursor, limit + 1))
+        has_older = len(rows) > limit
+        rows = rows[:limit]
+        has_newer = older_than is not None
+    return rows, has_older, has_newer
+
+
+async def get_remaining_capacity(location, booking_date, user_id=None):
+    # المقاعد المحجوزة فعلياً + الحجوزات المؤقتة السارية للمستخدمين الآخرين
+    row = await bookings_db.fetchone(
+        '''SELECT COALESCE((SELECT people FROM occupancy WHERE location=? AND booking_date=?), 0)
+                + COALESCE((SELECT SUM(people) FROM seat_holds
+                            WHERE location=? AND booking_date=? AND expires_at > ? AND user_id IS NOT ?), 0)''',
+        (location, booking_date, location, booking_date, time.time(), user_id))
+    return CAPACITY[location] - row[0]
+
+
+# --- الحجز المؤقت للمقاعد ---
+# يُنشأ الحجز المؤقت أو يُجدَّد بعبارة واحدة تتحقق من السعة وتكتب معاً،
+# فلا يمكن لطلبين متزامنين أن يريا السعة نفسها ويتجاوزاها.
+_PLACE_HOLD_SQL = '''
+    INSERT INTO seat_holds (user_id, location, booking_date, people, expires_at)
+    SELECT :user_id, :location, :booking_date, :people, :now + :ttl
+    WHERE :people
+          + COALESCE((SELECT people FROM occupancy WHERE location = :location AND booking_date = :booking_date), 0)
+          + COALESCE((SELECT SUM(people) FROM seat_holds
+                      WHERE location = :location AND booking_date = :booking_date
+                      AND expires_at > :now AND user_id != :user_id), 0)
+          <= :capacity
+    ON CONFLICT (user_id) DO UPDATE SET
+        location = excluded.location,
+        booking_date = excluded.booking_date,
+        people = excluded.people,
+        expires_at = excluded.expires_at
+'''
+
+
+async def place_hold(user_id, location, booking_date, people):
+    params = {
+        "user_id": user_id,
+        "location": location,
+        "booking_date": booking_date,
+        "people": people,
+        "now": time.time(),
+        "ttl": HOLD_TTL,
+        "capacity": CAPACITY[location],
+    }
+
+    def _place(conn):
+        conn.execute("DELETE FROM seat_holds WHERE expires_at <= ?", (params["now"],))
+        return conn.execute(_PLACE_HOLD_SQL, params).rowcount
+
+    if not await bookings_db.run(_place):
         return False
-    finally:
-        conn.close()
+    occupancy_grid.hold(user_id, location, booking_date, people, params["now"] + HOLD_TTL)
+    return True
 
 
-def approve_booking(payment_code):
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("UPDATE bookings SET status='approved' WHERE payment_code=?", (payment_code,))
-    conn.commit()
-    rows_affected = c.rowcount
-    conn.close()
-    return rows_affected > 0
+async def lease_node_id():
+    # رقم فريد لكل عملية تشغيل حتى لا تتصادم أكواد الدفع بين عدة عمليات
+    def _lease(conn):
+        c = conn.cursor()
+        c.execute("INSERT OR IGNORE INTO counters (name, value) VALUES ('payment_node', -1)")
+        c.execute("UPDATE counters SET value = value + 1 WHERE name='payment_node'")
+        c.execute("SELECT value FROM counters WHERE name='payment_node'")
+        return c.fetchone()[0]
 
+    return await bookings_db.run(_lease)
 
-def reject_booking(payment_code, reason=None):
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("UPDATE bookings SET status=?, reject_reason=? WHERE payment_code=?",
-              (f'rejected: {reason}' if reason else 'rejected', reason, payment_code))
-    conn.commit()
-    rows_affected = c.rowcount
-    conn.close()
-    return rows_affected > 0
 
+async def release_hold(user_id):
+    rows_affected = await bookings_db.execute("DELETE FROM seat_holds WHERE user_id=?", (user_id,))
+    occupancy_grid.release(user_id)
+    return rows_affected > 0
 
-def get_pending_bookings():
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("SELECT * FROM bookings WHERE status='pending'")
-    bookings = c.fetchall()
-    conn.close()
-    return bookings
 
+# --- المهام المجدولة ---
+# مهمة دورية واحدة بدل مؤقت لكل حجز: تختار الحجوزات المستحقة عبر الفهرس
+# (status, booking_date) على دفعات من SCHEDULER_CHUNK، كل دفعة معاملة قصيرة على
+# خيط قاعدة البيانات، فلا تتوقف حلقة الأحداث مهما كثرت الحجوزات. كل دفعة تحجز صفوفها
+# بعبارة UPDATE ... RETURNING واحدة، فتشغيل المهمة في عدة عمال لا يكرر العمل.
+EXPIRE_PENDING_SQL = '''
+    UPDATE bookings SET status=:status, reject_reason=:reason
+    WHERE id IN (SELECT id FROM bookings WHERE status='pending' AND booking_date < :today LIMIT :limit)
+    RETURNING location, booking_date
+'''
+CLAIM_REMINDERS_SQL = '''
+    UPDATE bookings SET reminded_at=:now
+    WHERE id IN (SELECT id FROM bookings WHERE status='approved' AND booking_date=:day AND reminded_at IS NULL
+                 LIMIT :limit)
+    RETURNING user_id, payment_code, name, location, people, booking_date
+'''
+# نقل دفعة من الحجوزات المنتهية إلى الأرشيف: النسخ والحذف في المعاملة نفسها، فلا
+# يُرى الحجز في الجدولين معاً ولا يضيع من كليهما
+ARCHIVE_SQL = '''
+    INSERT INTO bookings_archive (id, payment_code, name, location, people, amount, transfer_number, status,
+                                  user_id, created_at, booking_date, reject_reason, reminded_at, archived_at)
+    SELECT id, payment_code, name, location, people, amount, transfer_number, status,
+           user_id, created_at, booking_date, reject_reason, reminded_at, :now FROM bookings
+    WHERE booking_date < :cutoff AND status != 'pending' ORDER BY booking_date LIMIT :limit
+    RETURNING id
+'''
+DELETE_ARCHIVED_SQL = "DELETE FROM bookings WHERE id IN (SELECT value FROM json_each(?))"
+# عامل واحد فقط يرسل التذكير في كل فترة: تحديث مشروط لوقت آخر تذكير في counters
+CLAIM_NUDGE_SQL = '''
+    INSERT INTO counters (name, value) VALUES ('admin_nudge', :now)
+    ON CONFLICT (name) DO UPDATE SET value = excluded.value WHERE value <= :now - :interval
+'''
+
+
+async def expire_stale_bookings(today, limit=SCHEDULER_CHUNK):
+    # الحجوزات المعلقة التي مضى تاريخها تُرفض فتُحرَّر مقاعدها
+    params = {"status": f"rejected: {EXPIRED_REASON}", "reason": EXPIRED_REASON, "today": today, "limit": limit}
+
+    def _expire(conn):
+        rows = conn.execute(EXPIRE_PENDING_SQL, params).fetchall()
+        return len(rows), availability.read_cells(conn, rows)
+
+    total = 0
+    while True:
+        count, cells = await bookings_db.run(_expire)
+        occupancy_grid.apply(cells)
+        total += count
+        if count < limit:
+            return total
+
+
+async def queue_reminders(day, limit=SCHEDULER_CHUNK):
+    # تذكير الضيوف عبر صندوق الصادر، فيمر بحدود الإرسال في NotificationDispatcher
+    def _remind(conn):
+        rows = conn.execute(CLAIM_REMINDERS_SQL, {"now": datetime.now(), "day": day, "limit": limit}).fetchall()
+        outbox.enqueue_many(conn, [
+            (user_id, "reminder", {"payment_code": code, "name": name, "location": location, "people": people,
+                                   "booking_date": booking_date})
+            for user_id, code, name, location, people, booking_date in rows
+        ])
+        return len(rows)
+
+    total = 0
+    while True:
+        count = await bookings_db.run(_remind)
+        total += count
+        if count < limit:
+            return total
+
+
+async def archive_past_bookings(cutoff, limit=ARCHIVE_CHUNK):
+    # الحجوزات التي مضى على تاريخها ARCHIVE_AFTER_DAYS تنتقل إلى bookings_archive
+    def _archive(conn):
+        ids = [row[0] for row in conn.execute(ARCHIVE_SQL, {"now": datetime.now(), "cutoff": cutoff, "limit": limit})]
+        if ids:
+            conn.execute(DELETE_ARCHIVED_SQL, (json.dumps(ids),))
+        return len(ids)
+
+    total = 0
+    while True:
+        count = await bookings_db.run(_archive)
+        total += count
+        if count < limit:
+            return total
+
+
+async def nudge_admins():
+    # تنبيه المسؤولين بعدد الحجوزات المعلقة وأقدمها، مرة كل ADMIN_NUDGE_INTERVAL على الأكثر
+    admins = list_admins()
 
-def get_approved_bookings():
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("SELECT * FROM bookings WHERE status='approved' ORDER BY created_at DESC")
-    bookings = c.fetchall()
-    conn.close()
-    return bookings
+    def _nudge(conn):
+        pending = conn.execute("SELECT SUM(bookings) FROM booking_stats WHERE status='pending'").fetchone()[0]
+        if not pending or not admins:
+            return 0
+        if not conn.execute(CLAIM_NUDGE_SQL, {"now": int(time.time()), "interval": ADMIN_NUDGE_INTERVAL}).rowcount:
+            return 0
+        oldest = conn.execute("SELECT payment_code, name, booking_date FROM bookings WHERE status='pending' "
+                              "ORDER BY id LIMIT ?", (ADMIN_NUDGE_OLDEST,)).fetchall()
+        summary = {"pending": pending, "oldest": oldest}
+        outbox.enqueue_many(conn, [(admin[0], "pending_nudge", summary) for admin in admins])
+        return len(admins)
+
+    return await bookings_db.run(_nudge)
+
+
+async def run_scheduler(context: ContextTypes.DEFAULT_TYPE):
+    now = datetime.now(TIMEZONE)
+    expired = await expire_stale_bookings(now.date().isoformat())
+    reminded = 0
+    if now.hour >= REMINDER_HOUR:
+        reminded = await queue_reminders((now.date() + timedelta(days=1)).isoformat())
+    nudged = await nudge_admins()
+    archived = await archive_past_bookings((now.date() - timedelta(days=ARCHIVE_AFTER_DAYS)).isoformat())
+
+    if reminded or nudged:
+        wake_outbox(context)
+    if expired or reminded or nudged or archived:
+        logger.info(f"المهام المجدولة: {expired} حجز منتهي، {reminded} تذكير، {nudged} تنبيه للمسؤولين، "
+                    f"{archived} حجز مؤرشف")
 
 
 # --- معالجات الأوامر ---
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.message.from_user
-    admin_info = get_admin_info(user.id) if is_admin(user.id) else None
+    admin = is_admin(user.id)
+    admin_info = get_admin_info(user.id) if admin else None
 
-    welcome_msg = f"""
-✨ مرحباً بك في واحة الشام ✨
-📅 التاريخ الحالي: {get_current_date()}
-
-"""
+    welcome_msg = ui.WELCOME_HEADER.format(date=get_current_date())
 
     if admin_info:
         welcome_msg += f"👑 أنت مسؤول: {admin_info.get('full_name', user.full_name)}\n"
         if admin_info.get('username'):
             welcome_msg += f"📌 اليوزرنيم: @{admin_info['username']}\n"
 
-    welcome_msg += """
-📍 خياراتنا المتاحة:
-- مسابح نظيفة بمواصفات عالية
-- مطعم رئيسي يقدم وجبات متنوعة
+    welcome_msg += ui.WELCOME_FOOTER
 
-اختر من القائمة:
-"""
+    await update.message.reply_text(welcome_msg, reply_markup=ui.main_menu(admin))
+    return ConversationHandler.END
 
-    keyboard_layout = [
-        ["🏊 المسابح", "🍽️ المطاعم"],
-        ["🎉 العروض الخاصة", "📞 اتصل بنا"],
-        ["📅 حجز طاولة", "🆔 معرفي"]
-    ]
 
-    if is_admin(user.id):
-        keyboard_layout.append(["📋 الحجوزات الموافق عليها"])
+def clip(value, limit=MAX_FIELD_CHARS):
+    value = str(value)
+    return value if len(value) <= limit else value[:limit - 1] + "…"
 
-    keyboard = ReplyKeyboardMarkup(
-        keyboard_layout,
-        resize_keyboard=True,
-        input_field_placeholder="اختر من القائمة..."
+
+def join_page(blocks, limit=PAGE_MAX_CHARS, separator="\n➖➖➖➖➖\n"):
+    # يتوقف قبل الكتلة التي تتجاوز الحد (الأولى تُعرض دائماً)، ويعيد النص وعدد المعروض
+    shown = []
+    length = 0
+    for block in blocks:
+        if shown and length + len(separator) + len(block) > limit:
+            break
+        shown.append(block)
+        length += len(separator) + len(block)
+    return separator.join(shown), len(shown)
+
+
+def format_booking_status(status):
+    return "⏳ قيد الانتظار" if status == 'pending' else (
+        "✅ تمت الموافقة" if 'approved' in status else
+        f"❌ مرفوض: {clip(status.split(':')[-1])}" if ':' in status else "❌ مرفوض")
+
+
+def format_admin_booking(booking):
+    return (
+        f"🆔 كود الحجز: <code>{booking[1]}</code>\n"
+        f"👤 الاسم: {clip(booking[2])}\n"
+        f"📍 الموقع: {booking[3]}\n"
+        f"👥 عدد الأشخاص: {booking[4]}\n"
+        f"💰 المبلغ: {booking[5]:,} ل.س\n"
+        f"🔢 رقم التحويل: {clip(booking[6])}\n"
+        f"📅 تاريخ الحجز: {booking[10]}\n"
+        f"👤 معرف المستخدم: {booking[8]}\n"
     )
 
-    await update.message.reply_text(welcome_msg, reply_markup=keyboard)
-    return ConversationHandler.END
+
+def format_user_booking(booking):
+    msg = (
+        f"🆔 كود الحجز: <code>{booking[1]}</code>\n"
+        f"👤 الاسم: {clip(booking[2])}\n📍 الموقع: {booking[3]}\n"
+        f"💰 المبلغ: {booking[5]:,} ل.س\n🔢 رقم التحويل: {clip(booking[6])}\n"
+        f"📅 تاريخ الحجز: {booking[10]}\n"
+        f"📌 الحالة: {format_booking_status(booking[7])}\n"
+    )
+    if 'approved' in booking[7]:
+        msg += "🎉 تمت الموافقة على حجزك! استمتع بوقتك!\n"
+    return msg
+
+
+async def render_bookings_page(list_name, user_id=None, older_than=None, newer_than=None):
+    params = (user_id,) if list_name == "mine" else ()
+    rows, has_older, has_newer = await get_bookings_page(list_name, params, older_than, newer_than)
+    if not rows:
+        return None, None
+
+    formatter = format_user_booking if list_name == "mine" else format_admin_booking
+    text, shown = join_page(formatter(booking) for booking in rows)
+    if shown < len(rows):
+        # ما لم يتسع يظهر في الصفحة الأقدم التالية، فالمؤشر آخر حجز معروض
+        rows = rows[:shown]
+        has_older = True
+
+    buttons = []
+    if list_name == "pending":
+        buttons = [[InlineKeyboardButton(f"✅ الموافقة على {booking[1]}", callback_data=f"approve_{booking[1]}"),
+                    InlineKeyboardButton(ui.PICK, callback_data=f"pick_{booking[1]}")]
+                   for booking in rows]
+        buttons.append(list(ui.BULK_ROW))
+
+    navigation = []
+    if has_newer:
+        navigation.append(InlineKeyboardButton("⬅️ السابق", callback_data=f"page_{list_name}_newer_{rows[0][0]}"))
+    if has_older:
+        navigation.append(InlineKeyboardButton("التالي ➡️", callback_data=f"page_{list_name}_older_{rows[-1][0]}"))
+    if navigation:
+        buttons.append(navigation)
+
+    return text, InlineKeyboardMarkup(buttons) if buttons else None
 
 
 async def show_approved_bookings(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -313,54 +920,102 @@ async def show_approved_bookings(update: Update, context: ContextTypes.DEFAULT_T
         await update.message.reply_text("⚠️ ليس لديك صلاحية الدخول لهذه الصفحة")
         return
 
-    approved_bookings = get_approved_bookings()
-    if not approved_bookings:
+    total_bookings, total_people, total_amount = await get_status_totals('approved')
+    page, keyboard = await render_bookings_page("approved")
+    if not page:
         await update.message.reply_text("لا توجد حجوزات موافق عليها حتى الآن.")
         return
 
-    total_bookings = len(approved_bookings)
-    total_people = sum(booking[4] for booking in approved_bookings)
-    total_amount = sum(booking[5] for booking in approved_bookings)
-
+    # المجاميع من booking_stats تشمل الحجوزات المؤرشفة، والقائمة من الجدول الساخن وحده
     await update.message.reply_text(
-        f"📊 إحصائيات الحجوزات الموافق عليها:\n"
+        f"📊 إحصائيات الحجوزات الموافق عليها (تشمل الأرشيف):\n"
         f"• عدد الحجوزات: {total_bookings}\n"
         f"• إجمالي عدد الأشخاص: {total_people}\n"
         f"• إجمالي المبالغ: {total_amount:,} ل.س\n\n"
-        "تفاصيل الحجوزات:"
+        f"تفاصيل الحجوزات الحالية (آخر {ARCHIVE_AFTER_DAYS} أيام وما بعدها، والأقدم عبر /export archive):\n\n"
+        f"{page}",
+        reply_markup=keyboard
     )
 
-    for booking in approved_bookings:
-        booking_details = (
-            f"🆔 كود الحجز: <code>{booking[1]}</code>\n"
-            f"👤 الاسم: {booking[2]}\n"
-            f"📍 الموقع: {booking[3]}\n"
-            f"👥 عدد الأشخاص: {booking[4]}\n"
-            f"💰 المبلغ: {booking[5]:,} ل.س\n"
-            f"🔢 رقم التحويل: {booking[6]}\n"
-            f"📅 تاريخ الحجز: {booking[10]}\n"
-            f"👤 معرف المستخدم: {booking[8]}\n"
+
+def parse_export_args(args):
+    # /export [من YYYY-MM-DD] [إلى YYYY-MM-DD] [status] [location] [csv|gz|xlsx] [archive]
+    options = {"fmt": "csv", "status": None, "date_from": None, "date_to": None, "location": None,
+               "source": "bookings"}
+    for arg in args:
+        if arg in export.EXPORT_FORMATS:
+            options["fmt"] = arg
+        elif arg in export.EXPORT_SOURCES:
+            options["source"] = arg
+        elif arg in STATS_STATUSES:
+            options["status"] = arg
+        elif arg in CAPACITY:
+            options["location"] = arg
+        else:
+            datetime.strptime(arg, '%Y-%m-%d')
+            options["date_to" if options["date_from"] else "date_from"] = arg
+    if options["date_from"] and not options["date_to"]:
+        options["date_to"] = options["date_from"]
+    return options
+
+
+async def export_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user = update.message.from_user
+    if not is_admin(user.id):
+        await update.message.reply_text("⚠️ ليس لديك صلاحية تنفيذ هذا الأمر")
+        return
+
+    try:
+        options = parse_export_args(context.args)
+    except ValueError:
+        await update.message.reply_text(
+            "الاستخدام: /export [من YYYY-MM-DD] [إلى YYYY-MM-DD] [pending|approved|rejected] [location] [csv|gz|xlsx]"
+            " [archive]\n"
+            f"المواقع: {', '.join(CAPACITY)}"
         )
+        return
+    if options["fmt"] == "xlsx" and export.Workbook is None:
+        await update.message.reply_text("⚠️ تصدير xlsx يحتاج مكتبة openpyxl على الخادم. استخدم csv أو gz")
+        return
 
-        await update.message.reply_text(booking_details)
+    path, total = await export.export_bookings(bookings_db, **options)
+    try:
+        if os.path.getsize(path) > EXPORT_MAX_BYTES:
+            await update.message.reply_text(
+                f"⚠️ الملف ({total} حجز) أكبر من حد تيليغرام 50MB. "
+                "استخدم الصيغة gz أو ضيّق نطاق التاريخ"
+            )
+            return
+        filename = ("archive" if options["source"] == "archive" else "bookings") + "".join(
+            f"_{options[key]}" for key in ("date_from", "date_to", "status", "location") if options[key]
+        ) + export.EXPORT_SUFFIXES[options["fmt"]]
+        with open(path, "rb") as document:
+            await update.message.reply_document(document=document, filename=filename,
+                                                caption=f"📄 {total} حجز")
+    finally:
+        os.remove(path)
+
+
+# العدد من فهرسي المستخدم (idx_bookings_user و idx_archive_user) وحدهما، وآخر حالة ببحث
+# واحد على الفهرس نفسه؛ الأرشيف فقط إن لم يبق للمستخدم حجز في الجدول الساخن
+_USER_SUMMARY_SQL = (
+    "SELECT (SELECT COUNT(*) FROM bookings WHERE user_id=:user_id) "
+    "+ (SELECT COUNT(*) FROM bookings_archive WHERE user_id=:user_id), "
+    "COALESCE((SELECT status FROM bookings WHERE user_id=:user_id ORDER BY id DESC LIMIT 1), "
+    "(SELECT status FROM bookings_archive WHERE user_id=:user_id ORDER BY id DESC LIMIT 1))"
+)
 
 
 async def show_ids(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
     chat = update.effective_chat
-    bot = await context.bot.get_me()
+    # نتيجة get_me التي جلبها Application.initialize مرة واحدة عند التشغيل
+    bot = context.bot.bot
 
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("SELECT COUNT(*) FROM bookings WHERE user_id=?", (user.id,))
-    total_bookings = c.fetchone()[0]
-    c.execute("SELECT status FROM bookings WHERE user_id=? ORDER BY created_at DESC LIMIT 1", (user.id,))
-    last_booking = c.fetchone()
-    conn.close()
+    total_bookings, status = await bookings_db.fetchone(_USER_SUMMARY_SQL, {"user_id": user.id})
 
     last_booking_status = ""
-    if last_booking:
-        status = last_booking[0]
+    if status is not None:
         last_booking_status = "\n📅 آخر حجز: " + (
             "⏳ قيد الانتظار" if status == 'pending' else
             "✅ تمت الموافقة" if 'approved' in status else
@@ -400,20 +1055,36 @@ async def handle_myid_button(update: Update, context: ContextTypes.DEFAULT_TYPE)
     await show_ids(update, context)
 
 
+# --- تقويم الحجز ---
+# يُرسم من شبكة الإشغال في الذاكرة بدون استعلام: يوم لكل زر مع المقاعد المتبقية،
+# والأيام التي لا تتسع لعدد الأشخاص معلَّمة. الاختيار نفسه يمر عبر place_hold.
+async def render_calendar(location, people, user_id):
+    await occupancy_grid.ensure(get_today())
+    buttons = []
+    for day, remaining in occupancy_grid.calendar(location, user_id):
+        weekday = ui.WEEKDAYS[date.fromisoformat(day).weekday()]
+        label = f"{weekday} {day[8:]}/{day[5:7]}"
+        text = f"{label} • {remaining}" if remaining >= people else f"{ui.FULL_DAY} {label}"
+        buttons.append(InlineKeyboardButton(text, callback_data=f"day_{day}"))
+    return InlineKeyboardMarkup([buttons[i:i + 2] for i in range(0, len(buttons), 2)])
+
+
+def format_booking_summary(booking, remaining):
+    return (
+        f"📋 تفاصيل الحجز:\n\n📍 الموقع: {booking['location'].replace('_', ' ')}\n"
+        f"👤 الاسم: {booking['name']}\n"
+        f"👥 عدد الأشخاص: {booking['people']}\n"
+        f"📅 تاريخ الحجز: {booking['booking_date']}\n"
+        f"💰 السعر الإجمالي: {booking['people'] * PRICE_PER_PERSON:,} ل.س\n"
+        f"🪑 السعة المتبقية: {remaining - booking['people']}\n\n"
+        "هل تريد تأكيد الحجز؟"
+    )
+
+
 async def start_booking(update: Update, context: ContextTypes.DEFAULT_TYPE):
     context.user_data.clear()
-    keyboard = InlineKeyboardMarkup([
-        [InlineKeyboardButton("بار", callback_data='bar')],
-        [InlineKeyboardButton("جانب المسبح الشتوي", callback_data='winter_pool')],
-        [InlineKeyboardButton("جانب مسبح الأطفال", callback_data='kids_pool')],
-        [InlineKeyboardButton("جانب المسبح الصيفي", callback_data='summer_pool')],
-        [InlineKeyboardButton("مقابل الصالة", callback_data='hall_side')]
-    ])
-
-    await update.message.reply_text(
-        "📍 اختر موقع الطاولة:",
-        reply_markup=keyboard
-    )
+    await release_hold(update.effective_user.id)
+    await update.message.reply_text(ui.ASK_LOCATION, reply_markup=ui.LOCATION_KEYBOARD)
     return LOCATION
 
 
@@ -426,7 +1097,11 @@ async def select_location(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 
 async def get_name(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    context.user_data['name'] = update.message.text
+    name = update.message.text.strip()
+    if len(name) > MAX_NAME_LENGTH:
+        await update.message.reply_text(f"⚠️ الاسم طويل جداً. الرجاء إدخال اسم لا يتجاوز {MAX_NAME_LENGTH} حرفاً")
+        return NAME
+    context.user_data['name'] = name
     await update.message.reply_text("👥 كم عدد الأشخاص؟ (الرجاء إدخال رقم فقط)")
     return PEOPLE
 
@@ -438,7 +1113,8 @@ async def get_people(update: Update, context: ContextTypes.DEFAULT_TYPE):
             raise ValueError
 
         context.user_data['people'] = people
-        await update.message.reply_text("📅 الرجاء إدخال تاريخ الحجز (YYYY-MM-DD):")
+        keyboard = await render_calendar(context.user_data['location'], people, update.message.from_user.id)
+        await update.message.reply_text(ui.ASK_DATE, reply_markup=keyboard)
         return BOOKING_DATE
 
     except ValueError:
@@ -448,32 +1124,26 @@ async def get_people(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def get_booking_date(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
-        booking_date = update.message.text.strip()
-        datetime.strptime(booking_date, '%Y-%m-%d')
+        booking_day = datetime.strptime(update.message.text.strip(), '%Y-%m-%d').date()
+        error = booking_date_error(booking_day)
+        if error:
+            await update.message.reply_text(error)
+            return BOOKING_DATE
+        # بصيغة ISO دائماً (2030-1-5 ← 2030-01-05) لتصح المقارنة النصية في الاستعلامات
+        booking_date = booking_day.isoformat()
         context.user_data['booking_date'] = booking_date
 
         location = context.user_data['location']
-        remaining = CAPACITY[location] - sum(1 for b in get_pending_bookings() if b[3] == location)
+        user_id = update.message.from_user.id
+        held = await place_hold(user_id, location, booking_date, context.user_data['people'])
+        remaining = await get_remaining_capacity(location, booking_date, user_id)
 
-        if context.user_data['people'] > remaining:
+        if not held:
             await update.message.reply_text(f"⚠️ العدد يتجاوز السعة المتبقية ({remaining}). الرجاء إدخال عدد أقل")
             return PEOPLE
 
-        keyboard = InlineKeyboardMarkup([
-            [InlineKeyboardButton("✅ تأكيد الحجز", callback_data='confirm')],
-            [InlineKeyboardButton("❌ إلغاء", callback_data='cancel')]
-        ])
-
-        await update.message.reply_text(
-            f"📋 تفاصيل الحجز:\n\n📍 الموقع: {location.replace('_', ' ')}\n"
-            f"👤 الاسم: {context.user_data['name']}\n"
-            f"👥 عدد الأشخاص: {context.user_data['people']}\n"
-            f"📅 تاريخ الحجز: {booking_date}\n"
-            f"💰 السعر الإجمالي: {context.user_data['people'] * PRICE_PER_PERSON:,} ل.س\n"
-            f"🪑 السعة المتبقية: {remaining - context.user_data['people']}\n\n"
-            "هل تريد تأكيد الحجز؟",
-            reply_markup=keyboard
-        )
+        await update.message.reply_text(format_booking_summary(context.user_data, remaining),
+                                        reply_markup=ui.CONFIRM_KEYBOARD)
         return CONFIRM
 
     except ValueError:
@@ -481,13 +1151,43 @@ async def get_booking_date(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return BOOKING_DATE
 
 
+async def select_booking_date(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    booking_date = query.data[len("day_"):]
+    location = context.user_data['location']
+    people = context.user_data['people']
+    user_id = query.from_user.id
+
+    # تقويم قديم من يوم سابق قد يحمل أياماً مضت
+    error = booking_date_error(date.fromisoformat(booking_date))
+    if error:
+        await query.answer(error, show_alert=True)
+        await query.edit_message_reply_markup(await render_calendar(location, people, user_id))
+        return BOOKING_DATE
+
+    if not await place_hold(user_id, location, booking_date, people):
+        await query.answer(f"⚠️ لا تتسع السعة المتبقية في {booking_date} لـ {people} أشخاص. اختر يوماً آخر",
+                           show_alert=True)
+        # التقويم كان قديماً (تغيير من عامل آخر): إعادة رسمه بالأرقام الحالية
+        if await occupancy_grid.refresh(get_today()):
+            await query.edit_message_reply_markup(await render_calendar(location, people, user_id))
+        return BOOKING_DATE
+
+    await query.answer()
+    context.user_data['booking_date'] = booking_date
+    remaining = occupancy_grid.remaining(location, booking_date, user_id)
+    await query.edit_message_text(format_booking_summary(context.user_data, remaining),
+                                  reply_markup=ui.CONFIRM_KEYBOARD)
+    return CONFIRM
+
+
 async def confirm_booking(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
 
     if query.data == 'confirm':
         context.user_data['amount'] = context.user_data['people'] * PRICE_PER_PERSON
-        context.user_data['payment_code'] = f"SHAM{datetime.now().strftime('%Y%m%d%H%M%S')}"
+        context.user_data['payment_code'] = payment_codes.next()
 
         await query.edit_message_text(
             f"💰 طريقة الدفع:\n\n1. أرسل المبلغ {context.user_data['amount']:,} ل.س إلى الرقم: {MERCHANT_PHONE}\n"
@@ -496,21 +1196,32 @@ async def confirm_booking(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
         return TRANSFER_NUMBER
     else:
+        await release_hold(query.from_user.id)
         await query.edit_message_text("❌ تم إلغاء الحجز")
         return ConversationHandler.END
 
 
 async def get_transfer_number(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    transfer_number = update.message.text.strip()
+    transfer_number = normalize_transfer_number(update.message.text)
 
-    if not transfer_number.isdigit():
+    if not transfer_number:
         await update.message.reply_text("⚠️ رقم التحويل غير صالح. الرجاء إدخال رقم التحويل الصحيح:")
         return TRANSFER_NUMBER
 
     context.user_data['transfer_number'] = transfer_number
     context.user_data['user_id'] = update.message.from_user.id
 
-    if save_booking(context.user_data, context):
+    # تجديد الحجز المؤقت (أو إعادة إنشائه إن انتهت مهلته) قبل التحويل إلى حجز فعلي
+    if not await place_hold(context.user_data['user_id'], context.user_data['location'],
+                            context.user_data['booking_date'], context.user_data['people']):
+        await update.message.reply_text(
+            "⚠️ انتهت مهلة حجز المقاعد ولم تعد السعة كافية لهذا التاريخ.\n"
+            "الرجاء بدء حجز جديد."
+        )
+        return ConversationHandler.END
+
+    result = await save_booking(context.user_data, context)
+    if result == BOOKING_SAVED:
         await update.message.reply_text(
             "✅ تم تسجيل طلب الحجز بنجاح\n\n"
             "تفاصيل طلبك:\n"
@@ -521,6 +1232,12 @@ async def get_transfer_number(update: Update, context: ContextTypes.DEFAULT_TYPE
             "يمكنك استخدام الأمر /status للتحقق من حالة حجزك.\n\n"
             "شكراً لثقتك بنا!"
         )
+    elif result == TRANSFER_REUSED:
+        await update.message.reply_text(
+            "⚠️ رقم التحويل هذا مستخدم في حجز آخر.\n"
+            "الرجاء التأكد من الرقم وإدخال رقم عملية التحويل الخاصة بهذا الحجز:"
+        )
+        return TRANSFER_NUMBER
     else:
         await update.message.reply_text(
             "⚠️ حدث خطأ في تسجيل الحجز. الرجاء المحاولة مرة أخرى."
@@ -532,33 +1249,13 @@ async def get_transfer_number(update: Update, context: ContextTypes.DEFAULT_TYPE
 
 async def check_status(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.message.from_user.id
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("SELECT * FROM bookings WHERE user_id=?", (user_id,))
-    user_bookings = c.fetchall()
-    conn.close()
+    page, keyboard = await render_bookings_page("mine", user_id=user_id)
 
-    if not user_bookings:
+    if not page:
         await update.message.reply_text("ليس لديك أي حجوزات مسجلة.")
         return
 
-    for booking in user_bookings:
-        status = "⏳ قيد الانتظار" if booking[7] == 'pending' else (
-            "✅ تمت الموافقة" if 'approved' in booking[7] else
-            f"❌ مرفوض: {booking[7].split(':')[-1]}" if ':' in booking[7] else "❌ مرفوض")
-
-        msg = (
-            f"🔄 حالة الحجز:\n\n🆔 كود الحجز: <code>{booking[1]}</code>\n"
-            f"👤 الاسم: {booking[2]}\n📍 الموقع: {booking[3]}\n"
-            f"💰 المبلغ: {booking[5]:,} ل.س\n🔢 رقم التحويل: {booking[6]}\n"
-            f"📅 تاريخ الحجز: {booking[10]}\n"
-            f"📌 الحالة: {status}\n\n"
-        )
-
-        if 'approved' in booking[7]:
-            msg += "🎉 تمت الموافقة على حجزك! استمتع بوقتك!"
-
-        await update.message.reply_text(msg)
+    await update.message.reply_text(f"🔄 حالة حجوزاتك:\n\n{page}", reply_markup=keyboard)
 
 
 async def admin_approve(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -567,43 +1264,110 @@ async def admin_approve(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("⚠️ ليس لديك صلاحية الدخول لهذه الصفحة")
         return
 
-    pending = get_pending_bookings()
-    if not pending:
+    total_bookings, total_people, _ = await get_status_totals('pending')
+    page, keyboard = await render_bookings_page("pending")
+    if not page:
         await update.message.reply_text("لا توجد حجوزات منتظرة للموافقة")
         return
 
-    total_bookings = len(pending)
-    total_people = sum(booking[4] for booking in pending)
-
     await update.message.reply_text(
         f"📊 إحصائيات الحجوزات:\n"
         f"• عدد الحجوزات المعلقة: {total_bookings}\n"
         f"• إجمالي عدد الأشخاص: {total_people}\n\n"
-        "تفاصيل الحجوزات:"
+        "تفاصيل الحجوزات:\n\n"
+        f"{page}",
+        reply_markup=keyboard
     )
 
-    for booking in pending:
-        booking_details = (
-            f"🆔 كود الحجز: <code>{booking[1]}</code>\n"
-            f"👤 الاسم: {booking[2]}\n"
-            f"📍 الموقع: {booking[3]}\n"
-            f"👥 عدد الأشخاص: {booking[4]}\n"
-            f"💰 المبلغ: {booking[5]:,} ل.س\n"
-            f"🔢 رقم التحويل: {booking[6]}\n"
-            f"📅 تاريخ الحجز: {booking[10]}\n"
-        )
 
-        keyboard = InlineKeyboardMarkup([
-            [InlineKeyboardButton(
-                "✅ الموافقة على الحجز",
-                callback_data=f"approve_{booking[1]}")
-            ]
-        ])
+async def show_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user = update.message.from_user
+    if not is_admin(user.id):
+        await update.message.reply_text("⚠️ ليس لديك صلاحية الدخول لهذه الصفحة")
+        return
+
+    by_status, by_location, by_date = await get_booking_stats(get_current_date())
+    status_labels = {'pending': "⏳ قيد الانتظار", 'approved': "✅ موافق عليها", 'rejected': "❌ مرفوضة"}
+
+    message = "📊 إحصائيات الحجوزات\n\n📌 حسب الحالة:\n"
+    totals = {status: (0, 0, 0) for status in STATS_STATUSES}
+    totals.update({row[0]: row[1:] for row in by_status})
+    for status in STATS_STATUSES:
+        bookings, people, amount = totals[status]
+        message += f"• {status_labels[status]}: {bookings} حجز، {people} شخص، {amount:,} ل.س\n"
+
+    message += "\n📍 حسب الموقع (المعلقة والموافق عليها):\n"
+    for location, bookings, people, amount in by_location:
+        message += f"• {location.replace('_', ' ')}: {bookings} حجز، {people} شخص، {amount:,} ل.س\n"
+
+    message += f"\n📅 الأيام القادمة (أول {STATS_UPCOMING_DAYS} يوماً فيها حجوزات):\n"
+    for booking_date, bookings, people, amount in by_date:
+        message += f"• {booking_date}: {bookings} حجز، {people} شخص، {amount:,} ل.س\n"
+    if not by_date:
+        message += "• لا توجد حجوزات قادمة\n"
+
+    await update.message.reply_text(message)
+
+
+async def show_metrics(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user = update.message.from_user
+    if not is_admin(user.id):
+        await update.message.reply_text("⚠️ ليس لديك صلاحية الدخول لهذه الصفحة")
+        return
+
+    await update.message.reply_text(bot_metrics.render_summary(), parse_mode="HTML")
 
-        await update.message.reply_text(
-            booking_details,
-            reply_markup=keyboard
-        )
+
+async def audit_transfers(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user = update.message.from_user
+    if not is_admin(user.id):
+        await update.message.reply_text("⚠️ ليس لديك صلاحية الدخول لهذه الصفحة")
+        return
+
+    groups = await find_duplicate_transfers()
+    if not groups:
+        await update.message.reply_text("✅ لا توجد أرقام تحويل مكررة")
+        return
+
+    message = f"🔍 أرقام تحويل مستخدمة في أكثر من حجز: {len(groups)}\n\n"
+    shown = 0
+    for transfer_number, bookings in groups.items():
+        # رقم التحويل يكتبه الضيف وسبب الرفض يكتبه المسؤول: يُهرَّبان قبل إدراجهما في HTML
+        block = f"🔢 <code>{html.escape(transfer_number)}</code> ({len(bookings)} حجوزات)\n" + "".join(
+            f"• <code>{html.escape(code)}</code> {html.escape(format_booking_status(status))} - "
+            f"{html.escape(str(booking_date))} - {user_id}\n"
+            for code, status, user_id, booking_date in bookings) + "\n"
+        # حد طول رسالة تيليغرام 4096 حرفاً
+        if shown and len(message) + len(block) > TRANSFER_AUDIT_MAX_CHARS:
+            break
+        message += block
+        shown += 1
+    if shown < len(groups):
+        message += f"... و{len(groups) - shown} رقماً آخر"
+    await update.message.reply_text(message, parse_mode="HTML")
+
+
+async def handle_page(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    await query.answer()
+
+    _, list_name, direction, cursor = query.data.split('_')
+    if list_name != "mine" and not is_admin(query.from_user.id):
+        await query.edit_message_text("⚠️ ليس لديك صلاحية تنفيذ هذا الأمر")
+        return
+
+    cursor = int(cursor)
+    page, keyboard = await render_bookings_page(
+        list_name,
+        user_id=query.from_user.id,
+        older_than=cursor if direction == "older" else None,
+        newer_than=cursor if direction == "newer" else None
+    )
+    if not page:
+        await query.edit_message_text("لا توجد حجوزات أخرى.")
+        return
+
+    await query.edit_message_text(page, reply_markup=keyboard)
 
 
 async def handle_approve(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -611,45 +1375,213 @@ async def handle_approve(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await query.answer()
 
     user = query.from_user
-    if not is_admin(user.id):
+    if not await is_admin_now(user.id):
         await query.edit_message_text("⚠️ ليس لديك صلاحية تنفيذ هذا الأمر")
         return
 
     payment_code = query.data.split('_')[1]
-    if approve_booking(payment_code):
-        await notify_user_approval(context, payment_code)
+    result = await approve_booking(payment_code)
+    if result == BOOKING_MODERATED:
+        wake_outbox(context)
         await query.edit_message_text(
             f"✅ تمت الموافقة على الحجز {payment_code} بنجاح\n"
-            "تم إرسال إشعار للمستخدم بالموافقة"
+            "سيتم إرسال إشعار للمستخدم بالموافقة"
         )
+    elif result == ALREADY_PROCESSED:
+        await query.edit_message_text(f"ℹ️ الحجز {payment_code} تمت معالجته مسبقاً")
     else:
         await query.edit_message_text(
             f"⚠️ لم يتم العثور على الحجز {payment_code}"
         )
 
 
-async def reject_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+async def handle_reject(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    await query.answer()
+
+    user = query.from_user
+    if not await is_admin_now(user.id):
+        await query.edit_message_text("⚠️ ليس لديك صلاحية تنفيذ هذا الأمر")
+        return
+
+    payment_code = query.data.split('_')[1]
+    result = await reject_booking(payment_code)
+    if result == BOOKING_MODERATED:
+        await query.edit_message_text(f"❌ تم رفض الحجز {payment_code}")
+    elif result == ALREADY_PROCESSED:
+        await query.edit_message_text(f"ℹ️ الحجز {payment_code} تمت معالجته مسبقاً")
+    else:
+        await query.edit_message_text(f"⚠️ لم يتم العثور على الحجز {payment_code}")
+
+
+async def find_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.message.from_user
     if not is_admin(user.id):
+        await update.message.reply_text("⚠️ ليس لديك صلاحية الدخول لهذه الصفحة")
+        return
+
+    text = ' '.join(context.args)
+    rows = await search_bookings(text)
+    if rows is None:
+        await update.message.reply_text(
+            "الاستخدام: /find <نص>\n"
+            "يبحث في الاسم وكود الحجز ورقم التحويل ومعرف المستخدم (3 أحرف على الأقل)"
+        )
+        return
+    if not rows:
+        await update.message.reply_text(f"🔎 لا توجد حجوزات تطابق «{text}»")
+        return
+
+    more = len(rows) > FIND_LIMIT
+    rows = rows[:FIND_LIMIT]
+    page, shown = join_page(
+        f"{format_admin_booking(booking)}📌 الحالة: {format_booking_status(booking[7])}"
+        + ("\n🗄️ مؤرشف" if booking[13] else "") + "\n" for booking in rows)
+    more = more or shown < len(rows)
+    rows = rows[:shown]
+    header = f"🔎 نتائج البحث عن «{clip(text)}»" + (f" (أحدث {shown})" if more else "") + ":\n\n"
+    buttons = [[InlineKeyboardButton(f"✅ الموافقة على {booking[1]}", callback_data=f"approve_{booking[1]}"),
+                InlineKeyboardButton(f"❌ رفض {booking[1]}", callback_data=f"reject_{booking[1]}")]
+               for booking in rows if booking[7] == 'pending' and not booking[13]]
+    await update.message.reply_text(header + page, reply_markup=InlineKeyboardMarkup(buttons) if buttons else None)
+
+
+def format_moderation_summary(approved, changed, requested=None):
+    message = f"{'✅ تمت الموافقة على' if approved else '❌ تم رفض'} {len(changed)} حجز"
+    if requested is not None and requested > len(changed):
+        message += f"\n⚠️ {requested - len(changed)} غير موجودة أو ليست معلقة"
+    if changed:
+        message += "\n" + "، ".join(changed[:20]) + (" ..." if len(changed) > 20 else "")
+    return message
+
+
+async def handle_pick(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    if not is_admin(query.from_user.id):
+        await query.answer("⚠️ ليس لديك صلاحية تنفيذ هذا الأمر", show_alert=True)
+        return
+
+    await query.answer()
+    keyboard = [
+        [InlineKeyboardButton(ui.PICKED if button.text == ui.PICK else ui.PICK, callback_data=button.callback_data)
+         if button.callback_data == query.data else button for button in row]
+        for row in query.message.reply_markup.inline_keyboard
+    ]
+    await query.edit_message_reply_markup(InlineKeyboardMarkup(keyboard))
+
+
+async def handle_bulk(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    if not await is_admin_now(query.from_user.id):
+        await query.answer("⚠️ ليس لديك صلاحية تنفيذ هذا الأمر", show_alert=True)
+        return
+
+    codes = [button.callback_data.split('_', 1)[1]
+             for row in query.message.reply_markup.inline_keyboard for button in row
+             if button.text == ui.PICKED and button.callback_data.startswith("pick_")]
+    if not codes:
+        await query.answer("⚠️ لم تحدد أي حجز", show_alert=True)
+        return
+
+    await query.answer()
+    approved = query.data == "bulk_approve"
+    if approved:
+        changed = await approve_bookings(codes=codes)
+        wake_outbox(context)
+    else:
+        changed = await reject_bookings(codes=codes)
+
+    summary = format_moderation_summary(approved, changed, len(codes))
+    page, keyboard = await render_bookings_page("pending")
+    await query.edit_message_text(f"{summary}\n\n{page}" if page else summary, reply_markup=keyboard)
+
+
+def parse_bulk_filter(args):
+    # /approve_all YYYY-MM-DD [location] ...
+    booking_date = args[0] if args else None
+    datetime.strptime(booking_date or "", '%Y-%m-%d')
+    location = args[1] if len(args) > 1 and args[1] in CAPACITY else None
+    rest = args[2:] if location else args[1:]
+    return booking_date, location, ' '.join(rest) or None
+
+
+async def approve_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not await is_admin_now(update.message.from_user.id):
+        await update.message.reply_text("⚠️ ليس لديك صلاحية تنفيذ هذا الأمر")
+        return
+
+    if not context.args:
+        await update.message.reply_text("الاستخدام: /approve <code> <code> ...")
+        return
+
+    changed = await approve_bookings(codes=context.args)
+    wake_outbox(context)
+    await update.message.reply_text(format_moderation_summary(True, changed, len(set(context.args))))
+
+
+async def bulk_filter_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not await is_admin_now(update.message.from_user.id):
+        await update.message.reply_text("⚠️ ليس لديك صلاحية تنفيذ هذا الأمر")
+        return
+
+    approved = update.message.text.startswith("/approve_all")
+    try:
+        booking_date, location, reason = parse_bulk_filter(context.args)
+        if approved and reason:
+            # موقع غير معروف في /approve_all يجب ألا يتحول إلى موافقة على كل حجوزات اليوم
+            raise ValueError(reason)
+    except ValueError:
+        await update.message.reply_text(
+            "الاستخدام: /approve_all YYYY-MM-DD [location]\n"
+            "أو: /reject_all YYYY-MM-DD [location] [السبب]\n"
+            f"المواقع: {', '.join(CAPACITY)}"
+        )
+        return
+
+    if approved:
+        changed = await approve_bookings(booking_date=booking_date, location=location)
+        wake_outbox(context)
+    else:
+        changed = await reject_bookings(reason, booking_date=booking_date, location=location)
+    await update.message.reply_text(format_moderation_summary(approved, changed))
+
+
+async def reject_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user = update.message.from_user
+    if not await is_admin_now(user.id):
         await update.message.reply_text("⚠️ ليس لديك صلاحية تنفيذ هذا الأمر")
         return
 
+    if context.args:
+        # /reject <code>,<code>,... [السبب]
+        codes = [code for code in context.args[0].split(',') if code]
+        reason = ' '.join(context.args[1:]) or None
+        changed = await reject_bookings(reason, codes=codes)
+        await update.message.reply_text(format_moderation_summary(False, changed, len(set(codes))))
+        return
+
     parts = update.message.text.split('_')
+    if len(parts) < 2:
+        await update.message.reply_text("الاستخدام: /reject <code>,<code> [السبب] أو /reject_<code>_<السبب>")
+        return
     payment_code = parts[1]
     reason = ' '.join(parts[2:]) if len(parts) > 2 else None
 
-    if reject_booking(payment_code, reason):
+    result = await reject_booking(payment_code, reason)
+    if result == BOOKING_MODERATED:
         msg = f"✅ تم رفض الحجز {payment_code}"
         if reason:
             msg += f"\n📝 السبب: {reason}"
         await update.message.reply_text(msg)
+    elif result == ALREADY_PROCESSED:
+        await update.message.reply_text(f"ℹ️ الحجز {payment_code} تمت معالجته مسبقاً")
     else:
         await update.message.reply_text(f"⚠️ لم يتم العثور على الحجز {payment_code}")
 
 
 async def promote_admin(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.message.from_user
-    if not is_admin(user.id):
+    if not await is_admin_now(user.id):
         await update.message.reply_text("⚠️ ليس لديك صلاحية تنفيذ هذا الأمر")
         return
 
@@ -661,7 +1593,7 @@ async def promote_admin(update: Update, context: ContextTypes.DEFAULT_TYPE):
     username = context.args[1] if len(context.args) > 1 else None
     full_name = ' '.join(context.args[2:]) if len(context.args) > 2 else None
 
-    if add_admin(user_id, username, full_name):
+    if await add_admin(user_id, username, full_name):
         await update.message.reply_text(
             f"✅ تمت ترقية المستخدم إلى مسؤول:\n"
             f"🆔 الآيدي: {user_id}\n"
@@ -674,7 +1606,7 @@ async def promote_admin(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def demote_admin(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.message.from_user
-    if not is_admin(user.id):
+    if not await is_admin_now(user.id):
         await update.message.reply_text("⚠️ ليس لديك صلاحية تنفيذ هذا الأمر")
         return
 
@@ -683,7 +1615,7 @@ async def demote_admin(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     user_id = context.args[0]
-    if remove_admin(user_id):
+    if await remove_admin(user_id):
         await update.message.reply_text(f"✅ تم إزالة صلاحيات المسؤول من {user_id}")
     else:
         await update.message.reply_text("⚠️ فشل في إزالة الصلاحيات أو المستخدم ليس مسؤولاً")
@@ -713,81 +1645,149 @@ async def list_admins_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 
 async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    await update.message.reply_text(
-        "تم إلغاء العملية",
-        reply_markup=ReplyKeyboardMarkup([
-            ["🏊 المسابح", "🍽️ المطاعم"],
-            ["🎉 العروض الخاصة", "📞 اتصل بنا"],
-            ["📅 حجز طاولة", "🆔 معرفي"]
-        ], resize_keyboard=True)
-    )
+    await release_hold(update.effective_user.id)
+    await update.message.reply_text(ui.CANCELLED, reply_markup=ui.MAIN_MENU)
     return ConversationHandler.END
 
 
+async def conversation_timeout(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if update.effective_user:
+        await release_hold(update.effective_user.id)
+
+
 async def unknown_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    await update.message.reply_text(
-        "عذراً، لا أفهم هذا الأمر.\n"
-        "الرجاء استخدام الأزرار المتاحة أو كتابة /start للبدء من جديد.",
-        reply_markup=ReplyKeyboardMarkup([
-            ["🏊 المسابح", "🍽️ المطاعم"],
-            ["🎉 العروض الخاصة", "📞 اتصل بنا"],
-            ["📅 حجز طاولة", "🆔 معرفي"]
-        ], resize_keyboard=True)
-    )
+    await update.message.reply_text(ui.UNKNOWN_COMMAND, reply_markup=ui.MAIN_MENU)
 
 
-def main():
-    try:
-        app = Application.builder().token("7992401524:AAEIKl5ECMeIl24bRlw3A3_2j_0Uvae0yLQ").build()
+async def post_init(application: Application):
+    # initialize جلبت هوية البوت (get_me) وخزنتها في application.bot.bot قبل post_init
+    logger.info(f"🤖 البوت @{application.bot.bot.username} ({application.bot.bot.id})")
+    payment_codes.configure(await lease_node_id())
+    await admin_registry.load()
+    if not list_admins():
+        await add_admin(
+            user_id="5901137890",
+            username="Bashar8100",
+            full_name="بشار"
+        )
 
-        conv_handler = ConversationHandler(
-            entry_points=[
-                MessageHandler(filters.Regex(r'^(📅 حجز طاولة|حجز طاولة|حجز|booking|book)$'), start_booking)
-            ],
-            states={
-                LOCATION: [CallbackQueryHandler(select_location)],
-                NAME: [MessageHandler(filters.TEXT & ~filters.COMMAND, get_name)],
-                PEOPLE: [MessageHandler(filters.TEXT & ~filters.COMMAND, get_people)],
-                BOOKING_DATE: [MessageHandler(filters.TEXT & ~filters.COMMAND, get_booking_date)],
-                CONFIRM: [CallbackQueryHandler(confirm_booking)],
-                TRANSFER_NUMBER: [MessageHandler(filters.TEXT & ~filters.COMMAND, get_transfer_number)]
-            },
-            fallbacks=[
-                CommandHandler('cancel', cancel),
-                MessageHandler(filters.Regex(r'^(إلغاء|الغاء|تراجع)$'), cancel)
+
+def build_application():
+    app = (
+        Application.builder()
+        .token(BOT_TOKEN)
+        .base_url(BOT_API_URL)
+        .request(metrics.MeteredRequest(bot_metrics, connection_pool_size=256))
+        .get_updates_request(metrics.MeteredRequest(bot_metrics))
+        .persistence(SQLitePersistence(bookings_db, update_interval=PERSISTENCE_INTERVAL))
+        .post_init(post_init)
+        .build()
+    )
+
+    conv_handler = ConversationHandler(
+        entry_points=[
+            MessageHandler(filters.Regex(r'^(📅 حجز طاولة|حجز طاولة|حجز|booking|book)$'), start_booking)
+        ],
+        states={
+            LOCATION: [CallbackQueryHandler(select_location, pattern=f"^({'|'.join(CAPACITY)})$")],
+            NAME: [MessageHandler(filters.TEXT & ~filters.COMMAND, get_name)],
+            PEOPLE: [MessageHandler(filters.TEXT & ~filters.COMMAND, get_people)],
+            BOOKING_DATE: [
+                CallbackQueryHandler(select_booking_date, pattern=r'^day_\d{4}-\d{2}-\d{2}$'),
+                MessageHandler(filters.TEXT & ~filters.COMMAND, get_booking_date)
             ],
-            allow_reentry=True,
-            per_user=True
-        )
+            CONFIRM: [CallbackQueryHandler(confirm_booking, pattern=r'^(confirm|cancel)$')],
+            TRANSFER_NUMBER: [MessageHandler(filters.TEXT & ~filters.COMMAND, get_transfer_number)],
+            ConversationHandler.TIMEOUT: [TypeHandler(Update, conversation_timeout)]
+        },
+        fallbacks=[
+            CommandHandler('cancel', cancel),
+            MessageHandler(filters.Regex(r'^(إلغاء|الغاء|تراجع)$'), cancel)
+        ],
+        allow_reentry=True,
+        per_user=True,
+        conversation_timeout=HOLD_TTL,
+        name="booking",
+        persistent=True
+    )
+
+    app.job_queue.run_repeating(refresh_admins, interval=ADMIN_REFRESH_INTERVAL, first=ADMIN_REFRESH_INTERVAL)
+    app.job_queue.run_repeating(drain_outbox, interval=OUTBOX_POLL_INTERVAL, first=0)
+    app.job_queue.run_repeating(refresh_availability, interval=AVAILABILITY_REFRESH_INTERVAL, first=0)
+    app.job_queue.run_repeating(run_scheduler, interval=SCHEDULER_INTERVAL, first=SCHEDULER_INTERVAL / 10)
+
+    app.add_handler(conv_handler)
+    app.add_handler(CommandHandler("start", start))
+    app.add_handler(CommandHandler("status", check_status))
+    app.add_handler(CommandHandler("admin", admin_approve))
+    app.add_handler(CallbackQueryHandler(handle_approve, pattern=r'^approve_'))
+    app.add_handler(CallbackQueryHandler(handle_reject, pattern=r'^reject_'))
+    app.add_handler(CallbackQueryHandler(handle_page, pattern=r'^page_'))
+    app.add_handler(CallbackQueryHandler(handle_pick, pattern=r'^pick_'))
+    app.add_handler(CallbackQueryHandler(handle_bulk, pattern=r'^bulk_(approve|reject)$'))
+    app.add_handler(CommandHandler("approve", approve_command))
+    app.add_handler(CommandHandler(["approve_all", "reject_all"], bulk_filter_command))
+    app.add_handler(CommandHandler("reject", reject_command))
+    # الصيغة /reject_<code>_<reason> يعتبرها تيليغرام أمراً واحداً باسم مختلف فلا يلتقطها CommandHandler
+    app.add_handler(MessageHandler(filters.Regex(r'^/reject_(?!all(\s|$))'), reject_command))
+    app.add_handler(CommandHandler("promote", promote_admin))
+    app.add_handler(CommandHandler("demote", demote_admin))
+    app.add_handler(CommandHandler("admins", list_admins_cmd))
+    app.add_handler(CommandHandler("stats", show_stats))
+    app.add_handler(CommandHandler("metrics", show_metrics))
+    app.add_handler(CommandHandler("transfers", audit_transfers))
+    app.add_handler(CommandHandler("find", find_command))
+    app.add_handler(CommandHandler("export", export_command))
+    app.add_handler(CommandHandler("myid", show_ids))
+    app.add_handler(MessageHandler(filters.Regex(r'^🆔 معرفي$'), handle_myid_button))
+    app.add_handler(MessageHandler(filters.Regex(r'^📋 الحجوزات الموافق عليها$'), show_approved_bookings))
+    app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, unknown_command))
+    bot_metrics.instrument(app)
+    log_queue.instrument(app, metrics.iter_handlers, slow_ms=SLOW_HANDLER_MS)
+    return app
 
-        app.add_handler(conv_handler)
-        app.add_handler(CommandHandler("start", start))
-        app.add_handler(CommandHandler("status", check_status))
-        app.add_handler(CommandHandler("admin", admin_approve))
-        app.add_handler(CallbackQueryHandler(handle_approve, pattern=r'^approve_'))
-        app.add_handler(CommandHandler("reject", reject_command))
-        app.add_handler(CommandHandler("promote", promote_admin))
-        app.add_handler(CommandHandler("demote", demote_admin))
-        app.add_handler(CommandHandler("admins", list_admins_cmd))
-        app.add_handler(CommandHandler("myid", show_ids))
-        app.add_handler(MessageHandler(filters.Regex(r'^🆔 معرفي$'), handle_myid_button))
-        app.add_handler(MessageHandler(filters.Regex(r'^📋 الحجوزات الموافق عليها$'), show_approved_bookings))
-        app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, unknown_command))
 
+def main():
+    try:
         logger.info("🚀 بدء تشغيل البوت...")
-        app.run_polling(drop_pending_updates=True)
+        if BOT_WORKERS > 1 and BOT_MODE == "webhook":
+            asyncio.run(workers.run_sharded_webhook(
+                build_application, close_databases, BOT_WORKERS,
+                token=BOT_TOKEN,
+                base_url=BOT_API_URL,
+                webhook_url=WEBHOOK_URL,
+                path=WEBHOOK_PATH,
+                secret_token=WEBHOOK_SECRET,
+                listen=WEBHOOK_LISTEN,
+                port=WEBHOOK_PORT,
+                max_connections=WEBHOOK_MAX_CONNECTIONS
+            ))
+        elif BOT_WORKERS > 1:
+            asyncio.run(workers.run_sharded_polling(
+                build_application, close_databases, BOT_WORKERS,
+                token=BOT_TOKEN,
+                base_url=BOT_API_URL
+            ))
+        elif BOT_MODE == "webhook":
+            asyncio.run(webhook.run_webhook(
+                build_application(),
+                webhook_url=WEBHOOK_URL,
+                path=WEBHOOK_PATH,
+                secret_token=WEBHOOK_SECRET,
+                listen=WEBHOOK_LISTEN,
+                port=WEBHOOK_PORT,
+                max_connections=WEBHOOK_MAX_CONNECTIONS,
+                metrics=bot_metrics
+            ))
+        else:
+            build_application().run_polling(drop_pending_updates=True)
 
     except Exception as e:
         logger.error(f"حدث خطأ: {str(e)}")
     finally:
+        close_databases()
         logger.info("إيقاف البوت")
 
 
 if __name__ == "__main__":
-    if not list_admins():
-        add_admin(
-            user_id="5901137890",
-            username="Bashar8100",
-            full_name="بشار"
-        )
     main()
@@ -0,0 +1,122 @@
+import asyncio
+import csv
+import gzip
+import os
+import tempfile
+
+try:
+    from openpyxl import Workbook
+except ImportError:
+    Workbook = None
+
+EXPORT_COLUMNS = ("payment_code", "transfer_number", "amount", "status", "booking_date", "location", "people",
+                  "name", "user_id", "created_at")
+EXPORT_SUFFIXES = {"csv": ".csv", "gz": ".csv.gz", "xlsx": ".xlsx"}
+EXPORT_FORMATS = tuple(EXPORT_SUFFIXES)
+EXPORT_CHUNK = 5000
+
+# دفعات بمفتاح المعرّف (keyset) بدل OFFSET: كل دفعة بحث على المفتاح الأساسي يبدأ من
+# آخر معرّف، فيبقى زمن الدفعة ثابتاً مهما كبر الجدول. source=archive للحجوزات المؤرشفة.
+EXPORT_SQL = {
+    "bookings": (
+        "SELECT id, payment_code, transfer_number, amount, status, booking_date, location, people, "
+        "name, user_id, created_at FROM bookings "
+        "WHERE id > :after "
+        "AND (:status IS NULL OR status LIKE :status || '%') "
+        "AND (:date_from IS NULL OR booking_date >= :date_from) "
+        "AND (:date_to IS NULL OR booking_date <= :date_to) "
+        "AND (:location IS NULL OR location = :location) "
+        "ORDER BY id LIMIT :limit"
+    ),
+    "archive": (
+        "SELECT id, payment_code, transfer_number, amount, status, booking_date, location, people, "
+        "name, user_id, created_at FROM bookings_archive "
+        "WHERE id > :after "
+        "AND (:status IS NULL OR status LIKE :status || '%') "
+        "AND (:date_from IS NULL OR booking_date >= :date_from) "
+        "AND (:date_to IS NULL OR booking_date <= :date_to) "
+        "AND (:location IS NULL OR location = :location) "
+        "ORDER BY id LIMIT :limit"
+    ),
+}
+EXPORT_SOURCES = tuple(EXPORT_SQL)
+
+# نص يبدأ بأحد هذه الأحرف يُنفَّذ كصيغة عند فتح الملف في Excel، والاسم يكتبه الضيف
+FORMULA_PREFIXES = ("=", "+", "-", "@")
+
+
+def escape_formulas(rows):
+    for row in rows:
+        yield [f"'{value}" if isinstance(value, str) and value.startswith(FORMULA_PREFIXES) else value
+               for value in row]
+
+
+class CsvSink:
+    def __init__(self, path, compress=False):
+        # utf-8-sig حتى يعرض Excel الأسماء العربية بشكل صحيح
+        self._file = (gzip.open(path, "wt", encoding="utf-8-sig", newline="") if compress
+                      else open(path, "w", encoding="utf-8-sig", newline=""))
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(EXPORT_COLUMNS)
+
+    def write(self, rows):
+        self._writer.writerows(escape_formulas(rows))
+
+    def close(self):
+        self._file.close()
+
+
+class XlsxSink:
+    def __init__(self, path):
+        # write_only: الصفوف تُكتب إلى ملفات مؤقتة على القرص ولا تبقى في الذاكرة
+        self._path = path
+        self._workbook = Workbook(write_only=True)
+        self._sheet = self._workbook.create_sheet("bookings")
+        self._sheet.append(EXPORT_COLUMNS)
+
+    def write(self, rows):
+        for row in escape_formulas(rows):
+            self._sheet.append(row)
+
+    def close(self):
+        self._workbook.save(self._path)
+
+
+def open_sink(path, fmt):
+    if fmt == "xlsx":
+        return XlsxSink(path)
+    return CsvSink(path, compress=fmt == "gz")
+
+
+def _write_chunk(conn, sink, sql, params):
+    rows = conn.execute(sql, params).fetchall()
+    sink.write(row[1:] for row in rows)
+    return (rows[-1][0] if rows else None), len(rows)
+
+
+# --- تصدير الحجوزات ---
+# يكتب الحجوزات المطابقة إلى ملف مؤقت على دفعات من EXPORT_CHUNK صف. كل دفعة معاملة
+# قصيرة على خيط قاعدة البيانات (والكتابة إلى الملف تتم هناك أيضاً)، فتتخلل بقية
+# الاستعلامات بين الدفعات ولا تتجاوز الذاكرة دفعة واحدة مهما كان عدد الصفوف.
+async def export_bookings(db, fmt="csv", status=None, date_from=None, date_to=None, location=None,
+                          source="bookings", chunk_size=EXPORT_CHUNK):
+    fd, path = tempfile.mkstemp(prefix="bookings-", suffix=EXPORT_SUFFIXES[fmt])
+    os.close(fd)
+    params = {"after": 0, "status": status, "date_from": date_from, "date_to": date_to, "location": location,
+              "limit": chunk_size}
+    total = 0
+    try:
+        sink = await asyncio.to_thread(open_sink, path, fmt)
+        try:
+            while True:
+                last_id, count = await db.run(_write_chunk, sink, EXPORT_SQL[source], params)
+                total += count
+                if count < chunk_size:
+                    break
+                params["after"] = last_id
+        finally:
+            await asyncio.to_thread(sink.close)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path, total
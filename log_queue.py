@@ -0,0 +1,134 @@
+import atexit
+import contextvars
+import json
+import logging
+import queue
+import sys
+import time
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+# حقول إضافية تُضاف إلى السجل إن وُجدت (extra=... أو من سياق التحديث الحالي)
+FIELDS = ("handler", "user_id", "latency_ms")
+
+# المعالج والمستخدم للتحديث الجاري، تضعهما instrument لكل استدعاء
+update_context = contextvars.ContextVar("update_context", default=None)
+
+
+# --- ما يجري على خيط حلقة الأحداث ---
+# QueueHandler لا يفعل إلا تثبيت نص الرسالة وإرفاق سياق التحديث ووضع السجل في
+# الطابور؛ التنسيق والكتابة إلى المجرى في خيط QueueListener. لا يُنسخ السجل ولا
+# يُنسَّق الاستثناء هنا لأن الطابور داخل العملية نفسها.
+class LoopQueueHandler(QueueHandler):
+    def prepare(self, record):
+        record.msg = record.getMessage()
+        record.args = None
+        context = update_context.get()
+        if context is not None and not hasattr(record, "handler"):
+            record.handler, record.user_id = context
+        return record
+
+
+# سطور INFO من httpx (سطر لكل طلب HTTP) و telegram و apscheduler كثيرة تحت الحمل: يمر واحد من كل
+# every منها، وما دون ذلك يُسقط قبل دخول الطابور. التحذيرات والأخطاء تمر كلها.
+class SamplingFilter(logging.Filter):
+    def __init__(self, prefixes=("httpx", "telegram", "apscheduler"), every=100):
+        super().__init__()
+        self.prefixes = tuple(prefixes)
+        self.every = every
+        self.seen = 0
+
+    def filter(self, record):
+        if record.levelno > logging.INFO or not record.name.startswith(self.prefixes):
+            return True
+        self.seen += 1
+        return self.every <= 1 or self.seen % self.every == 1
+
+
+# --- ما يجري على خيط الكتابة ---
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for field in FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record):
+        line = super().format(record)
+        extra = " ".join(f"{field}={getattr(record, field)}" for field in FIELDS
+                         if getattr(record, field, None) is not None)
+        return f"{line} [{extra}]" if extra else line
+
+
+class Listener(QueueListener):
+    def stop(self):
+        if self._thread is not None:
+            super().stop()
+
+
+# --- التهيئة ---
+# تستبدل معالجات الجذر بـ QueueHandler واحد وتشغّل خيط الكتابة، وتوقفه عند الخروج
+# بعد تفريغ ما بقي في الطابور.
+def setup_logging(level=logging.INFO, fmt="text", sample_every=100, stream=None):
+    handler = logging.StreamHandler(stream or sys.stderr)
+    handler.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter(TEXT_FORMAT))
+
+    records = queue.SimpleQueue()
+    queue_handler = LoopQueueHandler(records)
+    queue_handler.addFilter(SamplingFilter(every=sample_every))
+
+    root = logging.getLogger()
+    for old in root.handlers[:]:
+        root.removeHandler(old)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    # لا يستخدم أي من التنسيقين اسم الملف أو رقم السطر: بدون _srcfile لا يمشي
+    # logging على إطارات المكدس لكل سجل (الطريقة الموثقة في قسم Optimization)
+    logging._srcfile = None
+    listener = Listener(records, handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
+
+
+# --- سياق المعالجات وتسجيل البطيء منها ---
+# كل سجل يُكتب أثناء معالجة تحديث يحمل اسم المعالج ومعرف المستخدم. المعالجات التي
+# تتجاوز slow_ms تُسجَّل كتحذير مع زمنها، وكل استدعاء يُسجَّل عند مستوى DEBUG.
+def instrument(application, iter_handlers, slow_ms=500):
+    for handler in iter_handlers(application):
+        handler.callback = _logged(handler.callback, slow_ms)
+
+
+def _logged(callback, slow_ms):
+    name = callback.__name__
+    logger = logging.getLogger(f"handlers.{name}")
+
+    async def logged(update, context):
+        user = getattr(update, "effective_user", None)
+        token = update_context.set((name, user.id if user else None))
+        started = time.perf_counter()
+        try:
+            return await callback(update, context)
+        finally:
+            latency_ms = round((time.perf_counter() - started) * 1000, 2)
+            if latency_ms >= slow_ms:
+                logger.warning("معالجة بطيئة", extra={"latency_ms": latency_ms})
+            elif logger.isEnabledFor(logging.DEBUG):
+                logger.debug("تمت المعالجة", extra={"latency_ms": latency_ms})
+            update_context.reset(token)
+
+    logged.__name__ = name
+    return logged
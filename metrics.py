@@ -0,0 +1,177 @@
+import time
+from bisect import bisect_left
+
+from telegram.ext import ConversationHandler
+from telegram.request import HTTPXRequest
+
+# حدود الـ buckets بالثواني (نفس حدود Prometheus الافتراضية تقريباً)
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+# --- مدرّج تكراري بحدود ثابتة ---
+# كل قياس يزيد عدّاداً واحداً في قائمة محجوزة مسبقاً، فلا تخصيص لكل استدعاء.
+class Histogram:
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def quantile(self, q):
+        # الحد الأعلى للـ bucket الذي يبلغ فيه التراكم q (تقدير من الأعلى)
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for bound, n in zip(BUCKETS, self.counts):
+            seen += n
+            if seen >= target:
+                return bound
+        return float("inf")
+
+
+class Stat:
+    __slots__ = ("latency", "errors")
+
+    def __init__(self):
+        self.latency = Histogram()
+        self.errors = 0
+
+
+# --- سجل المقاييس ---
+# زمن كل معالج وعدد استدعاءاته وأخطائه، طلبات Bot API الصادرة حسب الطريقة،
+# وزمن معاملات SQLite (الانتظار في طابور الاتصال والتنفيذ) لكل قاعدة بيانات.
+class Metrics:
+    def __init__(self):
+        self.started = time.time()
+        self.handlers = {}
+        self.api = {}
+        self.db_wait = {}
+        self.db_time = {}
+
+    def stat(self, table, name):
+        stat = table.get(name)
+        if stat is None:
+            stat = table[name] = Stat()
+        return stat
+
+    # --- المعالجات ---
+    def instrument(self, application):
+        for handler in iter_handlers(application):
+            handler.callback = self._timed(handler.callback, self.stat(self.handlers, handler.callback.__name__))
+
+    @staticmethod
+    def _timed(callback, stat):
+        latency = stat.latency
+
+        async def timed(update, context):
+            started = time.perf_counter()
+            try:
+                return await callback(update, context)
+            except BaseException:
+                stat.errors += 1
+                raise
+            finally:
+                latency.observe(time.perf_counter() - started)
+
+        timed.__name__ = callback.__name__
+        return timed
+
+    # --- SQLite ---
+    def db_observer(self, name):
+        wait = self.stat(self.db_wait, name).latency
+        run = self.stat(self.db_time, name)
+
+        def observe(wait_time, duration, ok):
+            wait.observe(wait_time)
+            run.latency.observe(duration)
+            if not ok:
+                run.errors += 1
+
+        return observe
+
+    # --- العرض ---
+    def render_prometheus(self):
+        lines = [f"bot_uptime_seconds {time.time() - self.started:.3f}"]
+        for metric, label, table in (
+                ("bot_handler_seconds", "handler", self.handlers),
+                ("bot_api_request_seconds", "method", self.api),
+                ("bot_db_transaction_seconds", "db", self.db_time),
+                ("bot_db_wait_seconds", "db", self.db_wait)):
+            lines.append(f"# TYPE {metric} histogram")
+            errors = []
+            for name, stat in sorted(table.items()):
+                h = stat.latency
+                cumulative = 0
+                for bound, n in zip(BUCKETS, h.counts):
+                    cumulative += n
+                    lines.append(f'{metric}_bucket{{{label}="{name}",le="{bound}"}} {cumulative}')
+                lines.append(f'{metric}_bucket{{{label}="{name}",le="+Inf"}} {h.count}')
+                lines.append(f'{metric}_sum{{{label}="{name}"}} {h.total:.6f}')
+                lines.append(f'{metric}_count{{{label}="{name}"}} {h.count}')
+                errors.append(f'{metric[:-len("_seconds")]}_errors_total{{{label}="{name}"}} {stat.errors}')
+            if errors and table is not self.db_wait:
+                lines.append(f"# TYPE {metric[:-len('_seconds')]}_errors_total counter")
+                lines.extend(errors)
+        return "\n".join(lines) + "\n"
+
+    def render_summary(self):
+        uptime = time.time() - self.started
+        handled = sum(stat.latency.count for stat in self.handlers.values())
+        lines = [f"⏱️ منذ {uptime / 60:.0f} دقيقة: {handled} تحديث ({handled / max(uptime, 1):.2f}/ث)", ""]
+        for title, table in (("المعالجات", self.handlers), ("Bot API", self.api), ("SQLite", self.db_time)):
+            rows = sorted(((n, s) for n, s in table.items() if s.latency.count), key=lambda r: -r[1].latency.total)
+            if not rows:
+                continue
+            lines.append(f"<b>{title}</b> (العدد / أخطاء / p50 / p95 مللي ثانية)")
+            for name, stat in rows:
+                h = stat.latency
+                lines.append(f"{name}: {h.count} / {stat.errors} / "
+                             f"≤{h.quantile(0.5) * 1000:g} / ≤{h.quantile(0.95) * 1000:g}")
+            lines.append("")
+        return "\n".join(lines)
+
+
+def iter_handlers(application):
+    # كل المعالجات المسجلة، بما فيها معالجات ConversationHandler الداخلية
+    def walk(handler):
+        if isinstance(handler, ConversationHandler):
+            for inner in handler.entry_points + handler.fallbacks:
+                yield from walk(inner)
+            for state_handlers in handler.states.values():
+                for inner in state_handlers:
+                    yield from walk(inner)
+        else:
+            yield handler
+
+    for handlers in application.handlers.values():
+        for handler in handlers:
+            yield from walk(handler)
+
+
+# --- طلبات Bot API الصادرة ---
+# نفس HTTPXRequest مع عدّ كل طلب وزمنه حسب طريقة API (sendMessage، getUpdates...)
+class MeteredRequest(HTTPXRequest):
+    def __init__(self, metrics, **kwargs):
+        super().__init__(**kwargs)
+        self.metrics = metrics
+
+    async def do_request(self, url, method, request_data=None, **kwargs):
+        stat = self.metrics.stat(self.metrics.api, url.rsplit("/", 1)[-1])
+        started = time.perf_counter()
+        try:
+            status, payload = await super().do_request(url, method, request_data, **kwargs)
+        except BaseException:
+            stat.errors += 1
+            raise
+        finally:
+            stat.latency.observe(time.perf_counter() - started)
+        if status >= 300:
+            stat.errors += 1
+        return status, payload
@@ -0,0 +1,366 @@
+import ast
+import re
+import sqlite3
+import sys
+
+
+# --- ترحيلات المخطط المرقّمة ---
+# كل ترحيل دالة تستقبل الاتصال وتُطبَّق مرة واحدة داخل معاملة، ويُسجَّل رقم
+# آخر إصدار مطبَّق في PRAGMA user_version. الترحيلات منشورة فلا تُعدَّل،
+# وأي تغيير جديد يُضاف كترحيل جديد في نهاية القائمة.
+def migrate(conn, migrations):
+    while True:
+        conn.execute("BEGIN IMMEDIATE")
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version >= len(migrations):
+            conn.rollback()
+            return version
+        try:
+            migrations[version](conn)
+            conn.execute(f"PRAGMA user_version = {version + 1}")
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+
+def _column_exists(conn, table, column):
+    return any(row[1] == column for row in conn.execute(f"PRAGMA table_info({table})"))
+
+
+def _table_exists(conn, table):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (table,)).fetchone() is not None
+
+
+# --- bookings.db ---
+# الإصدار 1: المخطط كما كانت تنشئه init_databases قبل نظام الترحيلات،
+# مكتوب بصيغة IF NOT EXISTS حتى يُطبَّق بأمان على قواعد البيانات القائمة.
+def _bookings_v1_base(conn):
+    c = conn.cursor()
+    c.execute('''CREATE TABLE IF NOT EXISTS bookings
+                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                 payment_code TEXT UNIQUE,
+                 name TEXT,
+                 location TEXT,
+                 people INTEGER,
+                 amount INTEGER,
+                 transfer_number TEXT,
+                 status TEXT DEFAULT 'pending',
+                 user_id INTEGER,
+                 created_at TIMESTAMP,
+                 booking_date TEXT)''')
+
+    # جدول الإشغال: مجموع المقاعد المحجوزة لكل (موقع، يوم)، تحدّثه القوادح
+    occupancy_exists = _table_exists(conn, "occupancy")
+    c.execute('''CREATE TABLE IF NOT EXISTS occupancy
+                 (location TEXT NOT NULL,
+                 booking_date TEXT NOT NULL,
+                 people INTEGER NOT NULL DEFAULT 0,
+                 PRIMARY KEY (location, booking_date)) WITHOUT ROWID''')
+    if not occupancy_exists:
+        c.execute('''INSERT INTO occupancy (location, booking_date, people)
+                     SELECT location, booking_date, SUM(people) FROM bookings
+                     WHERE status IN ('pending', 'approved')
+                     GROUP BY location, booking_date''')
+
+    c.execute('''CREATE TRIGGER IF NOT EXISTS occupancy_on_insert
+                 AFTER INSERT ON bookings WHEN NEW.status IN ('pending', 'approved')
+                 BEGIN
+                     INSERT INTO occupancy (location, booking_date, people)
+                     VALUES (NEW.location, NEW.booking_date, NEW.people)
+                     ON CONFLICT (location, booking_date) DO UPDATE SET people = people + excluded.people;
+                 END''')
+    c.execute('''CREATE TRIGGER IF NOT EXISTS occupancy_on_update_release
+                 AFTER UPDATE OF status, people, location, booking_date ON bookings
+                 WHEN OLD.status IN ('pending', 'approved')
+                 BEGIN
+                     UPDATE occupancy SET people = people - OLD.people
+                     WHERE location = OLD.location AND booking_date = OLD.booking_date;
+                 END''')
+    c.execute('''CREATE TRIGGER IF NOT EXISTS occupancy_on_update_claim
+                 AFTER UPDATE OF status, people, location, booking_date ON bookings
+                 WHEN NEW.status IN ('pending', 'approved')
+                 BEGIN
+                     INSERT INTO occupancy (location, booking_date, people)
+                     VALUES (NEW.location, NEW.booking_date, NEW.people)
+                     ON CONFLICT (location, booking_date) DO UPDATE SET people = people + excluded.people;
+                 END''')
+    c.execute('''CREATE TRIGGER IF NOT EXISTS occupancy_on_delete
+                 AFTER DELETE ON bookings WHEN OLD.status IN ('pending', 'approved')
+                 BEGIN
+                     UPDATE occupancy SET people = people - OLD.people
+                     WHERE location = OLD.location AND booking_date = OLD.booking_date;
+                 END''')
+
+    # الحجوزات المؤقتة: مقاعد محجوزة لمستخدم حتى يدخل رقم التحويل
+    c.execute('''CREATE TABLE IF NOT EXISTS seat_holds
+                 (user_id INTEGER PRIMARY KEY,
+                 location TEXT NOT NULL,
+                 booking_date TEXT NOT NULL,
+                 people INTEGER NOT NULL,
+                 expires_at REAL NOT NULL)''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_seat_holds_slot ON seat_holds (location, booking_date, expires_at)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_seat_holds_expiry ON seat_holds (expires_at)")
+
+    # عدادات عامة (مثل رقم العملية لمولد أكواد الدفع)
+    c.execute('''CREATE TABLE IF NOT EXISTS counters
+                 (name TEXT PRIMARY KEY,
+                 value INTEGER NOT NULL)''')
+
+    # صندوق الصادر للإشعارات
+    c.execute('''CREATE TABLE IF NOT EXISTS outbox
+                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                 chat_id INTEGER NOT NULL,
+                 kind TEXT NOT NULL,
+                 payload TEXT NOT NULL,
+                 attempts INTEGER NOT NULL DEFAULT 0,
+                 available_at REAL,
+                 created_at TIMESTAMP)''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_outbox_available ON outbox (available_at)")
+
+
+# الإصدار 2: العمود reject_reason الذي تكتبه reject_booking ولم يكن موجوداً في المخطط
+def _bookings_v2_reject_reason(conn):
+    if not _column_exists(conn, "bookings", "reject_reason"):
+        conn.execute("ALTER TABLE bookings ADD COLUMN reject_reason TEXT")
+
+
+# الإصدار 3: فهارس مطابقة لاستعلامات البوت
+def _bookings_v3_indexes(conn):
+    c = conn.cursor()
+    # قوائم الحجوزات حسب الحالة مرتبة بالـ id (الـ rowid ملحق ضمنياً بالفهرس)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_bookings_status ON bookings (status)")
+    # /status و /myid: حجوزات المستخدم مرتبة بالـ id
+    c.execute("CREATE INDEX IF NOT EXISTS idx_bookings_user ON bookings (user_id)")
+    # الإشغال حسب الموقع واليوم
+    c.execute("CREATE INDEX IF NOT EXISTS idx_bookings_location_date ON bookings (location, booking_date, status)")
+
+
+# الإصدار 4: ملخص إحصائيات محدَّث تزايدياً لكل (حالة، موقع، يوم)
+# تُجمع حالات الرفض "rejected: <سبب>" تحت الحالة rejected.
+def _bookings_v4_stats(conn):
+    c = conn.cursor()
+    c.execute('''CREATE TABLE IF NOT EXISTS booking_stats
+                 (status TEXT NOT NULL,
+                 location TEXT NOT NULL,
+                 booking_date TEXT NOT NULL,
+                 bookings INTEGER NOT NULL DEFAULT 0,
+                 people INTEGER NOT NULL DEFAULT 0,
+                 amount INTEGER NOT NULL DEFAULT 0,
+                 PRIMARY KEY (status, location, booking_date)) WITHOUT ROWID''')
+    c.execute('''INSERT INTO booking_stats (status, location, booking_date, bookings, people, amount)
+                 SELECT CASE WHEN status LIKE 'rejected%' THEN 'rejected' ELSE IFNULL(status, '') END,
+                        IFNULL(location, ''), IFNULL(booking_date, ''),
+                        COUNT(*), IFNULL(SUM(people), 0), IFNULL(SUM(amount), 0)
+                 FROM bookings GROUP BY 1, 2, 3''')
+
+    add_new = '''
+        INSERT INTO booking_stats (status, location, booking_date, bookings, people, amount)
+        VALUES (CASE WHEN NEW.status LIKE 'rejected%' THEN 'rejected' ELSE IFNULL(NEW.status, '') END,
+                IFNULL(NEW.location, ''), IFNULL(NEW.booking_date, ''),
+                1, IFNULL(NEW.people, 0), IFNULL(NEW.amount, 0))
+        ON CONFLICT (status, location, booking_date) DO UPDATE SET
+            bookings = bookings + 1,
+            people = people + excluded.people,
+            amount = amount + excluded.amount;'''
+    remove_old = '''
+        UPDATE booking_stats SET
+            bookings = bookings - 1,
+            people = people - IFNULL(OLD.people, 0),
+            amount = amount - IFNULL(OLD.amount, 0)
+        WHERE status = CASE WHEN OLD.status LIKE 'rejected%' THEN 'rejected' ELSE IFNULL(OLD.status, '') END
+          AND location = IFNULL(OLD.location, '') AND booking_date = IFNULL(OLD.booking_date, '');'''
+
+    c.execute(f"CREATE TRIGGER IF NOT EXISTS booking_stats_on_insert AFTER INSERT ON bookings BEGIN {add_new} END")
+    c.execute(f'''CREATE TRIGGER IF NOT EXISTS booking_stats_on_update
+                  AFTER UPDATE OF status, people, amount, location, booking_date ON bookings
+                  BEGIN {remove_old} {add_new} END''')
+    c.execute(f"CREATE TRIGGER IF NOT EXISTS booking_stats_on_delete AFTER DELETE ON bookings BEGIN {remove_old} END")
+
+
+# الإصدار 5: حالة المحادثات وبيانات المستخدمين لـ SQLitePersistence
+def _bookings_v5_conversation_state(conn):
+    c = conn.cursor()
+    c.execute('''CREATE TABLE IF NOT EXISTS conversation_state
+                 (name TEXT NOT NULL,
+                 key TEXT NOT NULL,
+                 state INTEGER,
+                 PRIMARY KEY (name, key)) WITHOUT ROWID''')
+    c.execute('''CREATE TABLE IF NOT EXISTS user_state
+                 (user_id INTEGER PRIMARY KEY,
+                 data TEXT NOT NULL)''')
+
+
+# الإصدار 6: فهرس أرقام التحويل لكشف إعادة استخدام رقم تحويل واحد لعدة حجوزات
+# (بحث عند تسجيل الحجز، ومرور واحد مرتب على الفهرس في تدقيق /transfers)
+def _bookings_v6_transfer_index(conn):
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_bookings_transfer ON bookings (transfer_number)")
+
+
+# الإصدار 7: فهرس FTS5 للبحث في الحجوزات (/find) بالاسم أو جزء من كود الحجز أو رقم
+# التحويل أو معرف المستخدم. محتوى خارجي (content='bookings') فلا تُكرَّر البيانات،
+# ومقسِّم trigram يطابق أي جزء من 3 أحرف فأكثر. القوادح لا تعمل إلا عند تغيّر
+# الأعمدة المفهرسة، فتغييرات الحالة لا تلمس الفهرس.
+FTS_COLUMNS = "name, payment_code, transfer_number, user_id"
+
+
+def _bookings_v7_search(conn):
+    c = conn.cursor()
+    c.execute(f'''CREATE VIRTUAL TABLE IF NOT EXISTS bookings_fts USING fts5
+                 ({FTS_COLUMNS}, content='bookings', content_rowid='id', tokenize='trigram')''')
+    c.execute("INSERT INTO bookings_fts (bookings_fts) VALUES ('rebuild')")
+
+    add_new = f"INSERT INTO bookings_fts (rowid, {FTS_COLUMNS}) " \
+              "VALUES (NEW.id, NEW.name, NEW.payment_code, NEW.transfer_number, NEW.user_id);"
+    remove_old = f"INSERT INTO bookings_fts (bookings_fts, rowid, {FTS_COLUMNS}) " \
+                 "VALUES ('delete', OLD.id, OLD.name, OLD.payment_code, OLD.transfer_number, OLD.user_id);"
+    c.execute(f"CREATE TRIGGER IF NOT EXISTS bookings_fts_on_insert AFTER INSERT ON bookings BEGIN {add_new} END")
+    c.execute(f'''CREATE TRIGGER IF NOT EXISTS bookings_fts_on_update
+                  AFTER UPDATE OF {FTS_COLUMNS} ON bookings
+                  BEGIN {remove_old} {add_new} END''')
+    c.execute(f"CREATE TRIGGER IF NOT EXISTS bookings_fts_on_delete AFTER DELETE ON bookings BEGIN {remove_old} END")
+
+
+# الإصدار 8: المهام المجدولة. فهرس (status, booking_date) لاختيار الحجوزات المستحقة
+# (المعلقة التي مضى تاريخها، والموافق عليها للغد)، والعمود reminded_at حتى لا يُرسل
+# التذكير مرتين ولو شغّل عدة عمال المهمة نفسها.
+def _bookings_v8_scheduler(conn):
+    if not _column_exists(conn, "bookings", "reminded_at"):
+        conn.execute("ALTER TABLE bookings ADD COLUMN reminded_at TIMESTAMP")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_bookings_status_date ON bookings (status, booking_date)")
+
+
+# الإصدار 9: أرشيف الحجوزات المنتهية. تُنقل الحجوزات التي مضى تاريخها إلى
+# bookings_archive (الأعمدة نفسها بالترتيب نفسه) على دفعات، فيبقى الجدول الساخن
+# للحجوزات الحالية والقادمة. قادح حذف الملخص وقادح حذف فهرس البحث يتجاهلان الصف
+# المؤرشف: تبقى مجاميع booking_stats لكل يوم كما هي، ويبقى الحجز قابلاً للبحث في /find.
+def _bookings_v9_archive(conn):
+    c = conn.cursor()
+    c.execute('''CREATE TABLE IF NOT EXISTS bookings_archive
+                 (id INTEGER PRIMARY KEY,
+                 payment_code TEXT,
+                 name TEXT,
+                 location TEXT,
+                 people INTEGER,
+                 amount INTEGER,
+                 transfer_number TEXT,
+                 status TEXT,
+                 user_id INTEGER,
+                 created_at TIMESTAMP,
+                 booking_date TEXT,
+                 reject_reason TEXT,
+                 reminded_at TIMESTAMP,
+                 archived_at TIMESTAMP)''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_archive_user ON bookings_archive (user_id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_archive_transfer ON bookings_archive (transfer_number)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_archive_payment_code ON bookings_archive (payment_code)")
+    # اختيار الحجوزات المستحقة للأرشفة بتاريخها وحده
+    c.execute("CREATE INDEX IF NOT EXISTS idx_bookings_date ON bookings (booking_date)")
+
+    archived = "WHEN NOT EXISTS (SELECT 1 FROM bookings_archive WHERE id = OLD.id)"
+    c.execute("DROP TRIGGER IF EXISTS booking_stats_on_delete")
+    c.execute(f'''CREATE TRIGGER booking_stats_on_delete AFTER DELETE ON bookings {archived}
+                  BEGIN
+                      UPDATE booking_stats SET
+                          bookings = bookings - 1,
+                          people = people - IFNULL(OLD.people, 0),
+                          amount = amount - IFNULL(OLD.amount, 0)
+                      WHERE status = CASE WHEN OLD.status LIKE 'rejected%' THEN 'rejected' ELSE IFNULL(OLD.status, '') END
+                        AND location = IFNULL(OLD.location, '') AND booking_date = IFNULL(OLD.booking_date, '');
+                  END''')
+    c.execute("DROP TRIGGER IF EXISTS bookings_fts_on_delete")
+    c.execute(f'''CREATE TRIGGER bookings_fts_on_delete AFTER DELETE ON bookings {archived}
+                  BEGIN
+                      INSERT INTO bookings_fts (bookings_fts, rowid, {FTS_COLUMNS})
+                      VALUES ('delete', OLD.id, OLD.name, OLD.payment_code, OLD.transfer_number, OLD.user_id);
+                  END''')
+
+
+BOOKINGS_MIGRATIONS = [
+    _bookings_v1_base,
+    _bookings_v2_reject_reason,
+    _bookings_v3_indexes,
+    _bookings_v4_stats,
+    _bookings_v5_conversation_state,
+    _bookings_v6_transfer_index,
+    _bookings_v7_search,
+    _bookings_v8_scheduler,
+    _bookings_v9_archive,
+]
+
+
+# --- admins.db ---
+def _admins_v1_base(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS admins
+                    (user_id TEXT PRIMARY KEY,
+                    username TEXT,
+                    full_name TEXT,
+                    added_at TIMESTAMP)''')
+
+
+ADMINS_MIGRATIONS = [
+    _admins_v1_base,
+]
+
+
+def migrate_bookings(conn):
+    return migrate(conn, BOOKINGS_MIGRATIONS)
+
+
+def migrate_admins(conn):
+    return migrate(conn, ADMINS_MIGRATIONS)
+
+
+# --- فحص خطط الاستعلام ---
+# يستخرج كل نص SQL ثابت من الوحدات المعطاة ويشغّل عليه EXPLAIN QUERY PLAN
+# على قاعدة بيانات مرحَّلة بالكامل، ويفشل عند وجود أي مسح كامل لجدول أو فهرس.
+# مسح json_each مسموح: هو مرور على قائمة القيم الممررة كمعامل وليس على جدول. وكذلك
+# الجداول الافتراضية بقيد مُمرَّر إلى فهرسها (مثل MATCH في FTS5: "INDEX 192:M4")،
+# أما المسح بلا قيد فيظهر "INDEX 0:" ويُرفض. نصوص f-string لا تُفحص، فيُكتب SQL
+# الوحدات المفحوصة نصوصاً ثابتة.
+# admin_registry.py غير مشمول: استعلاماته على قاعدة المسؤولين (admins.db) لا قاعدة
+# الحجوزات، وتحميله للجدول كاملاً في الذاكرة مقصود (بضعة صفوف، بحث بالمفتاح الأساسي فيما عداه).
+QUERY_MODULES = ["bot2.py", "outbox.py", "persistence.py", "export.py", "availability.py"]
+SQL_PATTERN = re.compile(r"^\s*(SELECT|INSERT|UPDATE|DELETE|WITH)\b", re.IGNORECASE)
+NAMED_PARAM = re.compile(r"(?<!:):([A-Za-z_]\w*)")
+CONSTRAINED_VIRTUAL = re.compile(r"VIRTUAL TABLE INDEX \d+:\S")
+
+
+def find_queries(path):
+    with open(path, encoding="utf-8-sig") as f:
+        tree = ast.parse(f.read(), filename=path)
+
+    formatted = {id(node) for joined in ast.walk(tree) if isinstance(joined, ast.JoinedStr)
+                 for node in ast.walk(joined)}
+    return [(node.lineno, node.value) for node in ast.walk(tree)
+            if isinstance(node, ast.Constant) and isinstance(node.value, str)
+            and id(node) not in formatted and SQL_PATTERN.match(node.value)]
+
+
+def full_scans(conn, sql):
+    names = NAMED_PARAM.findall(sql)
+    params = {name: None for name in names} if names else (None,) * sql.count("?")
+    plan = conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+    return [row[-1] for row in plan if row[-1].startswith("SCAN")
+            and row[-1] != "SCAN CONSTANT ROW" and not row[-1].startswith("SCAN json_each")
+            and not CONSTRAINED_VIRTUAL.search(row[-1])]
+
+
+def check_query_plans(conn, paths):
+    problems = []
+    for path in paths:
+        for lineno, sql in find_queries(path):
+            for detail in full_scans(conn, sql):
+                problems.append(f"{path}:{lineno}: {detail}\n    {' '.join(sql.split())}")
+    return problems
+
+
+if __name__ == "__main__":
+    conn = sqlite3.connect(":memory:")
+    migrate_bookings(conn)
+    problems = check_query_plans(conn, sys.argv[1:] or QUERY_MODULES)
+    for problem in problems:
+        print(problem)
+    if problems:
+        sys.exit(f"{len(problems)} full scan(s) found")
+    print("no full scans")
@@ -0,0 +1,87 @@
+import asyncio
+import logging
+import time
+
+from telegram.error import NetworkError, RetryAfter, TimedOut
+
+logger = logging.getLogger(__name__)
+
+
+# --- دلو الرموز لتحديد معدل الإرسال ---
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                self._refill(time.monotonic())
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def idle(self, now):
+        self._refill(now)
+        return self.tokens >= self.burst and not self._lock.locked()
+
+
+# --- موزع الإشعارات ---
+# إرسال متزامن بعدد محدود من الطلبات المفتوحة، مع احترام حدود تيليغرام
+# العامة (~30 رسالة/ثانية) ولكل دردشة (~1 رسالة/ثانية)، وإعادة المحاولة عند
+# RetryAfter أو أخطاء الشبكة.
+class NotificationDispatcher:
+    def __init__(self, concurrency=8, global_rate=30, per_chat_rate=1, per_chat_burst=3,
+                 max_retries=3, backoff=1.0):
+        self.concurrency = concurrency
+        self.per_chat_rate = per_chat_rate
+        self.per_chat_burst = per_chat_burst
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self._global = TokenBucket(global_rate, global_rate)
+        self._chats = {}
+        self._semaphore = None
+
+    def _chat_bucket(self, chat_id):
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) > 10000:
+                now = time.monotonic()
+                self._chats = {key: b for key, b in self._chats.items() if not b.idle(now)}
+            bucket = self._chats[chat_id] = TokenBucket(self.per_chat_rate, self.per_chat_burst)
+        return bucket
+
+    async def send_message(self, bot, chat_id, text, **kwargs):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+
+        for attempt in range(self.max_retries + 1):
+            await self._chat_bucket(chat_id).acquire()
+            await self._global.acquire()
+            try:
+                async with self._semaphore:
+                    await bot.send_message(chat_id=chat_id, text=text, **kwargs)
+                return True
+            except RetryAfter as e:
+                retry_after = e.retry_after
+                delay = retry_after.total_seconds() if hasattr(retry_after, "total_seconds") else retry_after
+            except (TimedOut, NetworkError) as e:
+                delay = self.backoff * (2 ** attempt)
+                logger.warning(f"خطأ شبكة أثناء الإرسال إلى {chat_id}: {str(e)}")
+            except Exception as e:
+                logger.error(f"فشل في إرسال رسالة إلى {chat_id}: {str(e)}")
+                return False
+
+            if attempt < self.max_retries:
+                await asyncio.sleep(delay)
+
+        logger.error(f"فشل في إرسال رسالة إلى {chat_id} بعد {self.max_retries + 1} محاولات")
+        return False
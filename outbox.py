@@ -0,0 +1,93 @@
+import asyncio
+import json
+import logging
+import time
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+
+# --- صندوق الصادر الدائم للإشعارات ---
+# تُكتب الإشعارات في جدول outbox ضمن معاملة الحجز أو تغيير الحالة نفسها،
+# ثم يفرغها عامل في الخلفية على دفعات. لا يُحذف الصف إلا بعد نجاح الإرسال
+# (تسليم مرة واحدة على الأقل)، فتنجو الإشعارات من إعادة التشغيل وأخطاء الشبكة.
+# كل دفعة تُحجز بتأجيل available_at مدة lease، فلا يرسلها عاملان معاً.
+def enqueue(conn, chat_id, kind, payload):
+    # تُستدعى من داخل دالة معاملة Database.run حتى تُكتب مع التغيير الأصلي
+    conn.execute("INSERT INTO outbox (chat_id, kind, payload, available_at, created_at) VALUES (?, ?, ?, ?, ?)",
+                 (chat_id, kind, json.dumps(payload, ensure_ascii=False), time.time(), datetime.now()))
+
+
+def enqueue_many(conn, notifications):
+    # notifications: أزواج (chat_id, kind, payload) تُدرج بعبارة executemany واحدة
+    now, created_at = time.time(), datetime.now()
+    conn.executemany("INSERT INTO outbox (chat_id, kind, payload, available_at, created_at) VALUES (?, ?, ?, ?, ?)",
+                     [(chat_id, kind, json.dumps(payload, ensure_ascii=False), now, created_at)
+                      for chat_id, kind, payload in notifications])
+
+
+class Outbox:
+    def __init__(self, db, deliver, batch_size=50, max_attempts=8, backoff=5, lease=300):
+        self.db = db
+        self.deliver = deliver
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.lease = lease
+        self._lock = None
+
+    async def _claim_batch(self):
+        # عبارة كتابة واحدة: تأخذ قفل الكتابة مباشرة بدل ترقية قراءة قد تفشل بـ SQLITE_BUSY
+        now = time.time()
+        return await self.db.fetchall(
+            "UPDATE outbox SET available_at = ? WHERE id IN "
+            "(SELECT id FROM outbox WHERE available_at <= ? ORDER BY available_at LIMIT ?) "
+            "RETURNING id, chat_id, kind, payload, attempts",
+            (now + self.lease, now, self.batch_size))
+
+    async def _settle(self, delivered, failed):
+        def _apply(conn):
+            conn.executemany("DELETE FROM outbox WHERE id=?", [(row_id,) for row_id in delivered])
+            now = time.time()
+            for row_id, attempts in failed:
+                # بعد استنفاد المحاولات يبقى الصف بلا موعد (available_at = NULL) للمراجعة اليدوية
+                available_at = now + self.backoff * (2 ** attempts) if attempts + 1 < self.max_attempts else None
+                conn.execute("UPDATE outbox SET attempts = attempts + 1, available_at = ? WHERE id=?",
+                             (available_at, row_id))
+
+        await self.db.run(_apply)
+
+    async def drain(self, bot):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        if self._lock.locked():
+            return 0, 0
+
+        total_delivered = total_failed = 0
+        async with self._lock:
+            while True:
+                batch = await self._claim_batch()
+                if not batch:
+                    break
+
+                results = await asyncio.gather(
+                    *(self.deliver(bot, chat_id, kind, json.loads(payload)) for _, chat_id, kind, payload, _ in batch),
+                    return_exceptions=True
+                )
+
+                delivered, failed = [], []
+                for (row_id, chat_id, kind, _, attempts), ok in zip(batch, results):
+                    if ok is True:
+                        delivered.append(row_id)
+                    else:
+                        if isinstance(ok, Exception):
+                            logger.error(f"فشل في معالجة إشعار {kind} إلى {chat_id}: {str(ok)}")
+                        failed.append((row_id, attempts))
+
+                await self._settle(delivered, failed)
+                total_delivered += len(delivered)
+                total_failed += len(failed)
+                if len(batch) < self.batch_size:
+                    break
+
+        return total_delivered, total_failed
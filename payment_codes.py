@@ -0,0 +1,54 @@
+import os
+import threading
+import time
+
+# --- مولد أكواد الدفع ---
+# كود على نمط Snowflake: 41 بت للزمن بالميلي ثانية + 10 بت لرقم العملية + 12 بت تسلسل.
+# يُرمَّز بأبجدية Crockford Base32 (أرقام وأحرف كبيرة فقط، بدون I L O U)
+# فيبقى قصيراً وسهل الكتابة وآمناً داخل callback_data و /reject_<code>_<reason>.
+PREFIX = "SHAM"
+ALPHABET = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+EPOCH_MS = 1704067200000  # 2024-01-01T00:00:00Z
+
+NODE_BITS = 10
+SEQUENCE_BITS = 12
+MAX_NODE_ID = (1 << NODE_BITS) - 1
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+CODE_LENGTH = 13  # ceil(63 / 5)
+
+
+def encode(value, length=CODE_LENGTH):
+    chars = []
+    for _ in range(length):
+        value, remainder = divmod(value, 32)
+        chars.append(ALPHABET[remainder])
+    return "".join(reversed(chars))
+
+
+class PaymentCodeGenerator:
+    def __init__(self, node_id=None, prefix=PREFIX):
+        self.prefix = prefix
+        self.node_id = 0
+        self.configure(os.getpid() if node_id is None else node_id)
+        self._lock = threading.Lock()
+        self._last_ms = 0
+        self._sequence = 0
+
+    def configure(self, node_id):
+        self.node_id = int(node_id) & MAX_NODE_ID
+
+    def next(self):
+        with self._lock:
+            now_ms = int(time.time() * 1000) - EPOCH_MS
+            if now_ms > self._last_ms:
+                self._last_ms = now_ms
+                self._sequence = 0
+            else:
+                # نفس الميلي ثانية أو رجوع الساعة: نتابع التسلسل، وعند امتلائه
+                # نستعير الميلي ثانية التالية بدلاً من الانتظار
+                self._sequence += 1
+                if self._sequence > MAX_SEQUENCE:
+                    self._last_ms += 1
+                    self._sequence = 0
+            value = (self._last_ms << (NODE_BITS + SEQUENCE_BITS)) | (self.node_id << SEQUENCE_BITS) | self._sequence
+        return self.prefix + encode(value)
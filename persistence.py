@@ -0,0 +1,122 @@
+import asyncio
+import json
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+
+# --- حفظ حالة المحادثات في SQLite ---
+# تحفظ حالة ConversationHandler و user_data حتى تنجو الحجوزات قيد الإنشاء من
+# إعادة التشغيل. يجمع التطبيق المستخدمين المتغيرين فقط ويستدعي update_* كل
+# update_interval ثانية؛ نكدّس هذه الاستدعاءات ونكتبها في معاملة واحدة.
+# بيانات المستخدم تُحمَّل عند أول تحديث له فقط وليس كلها عند التشغيل.
+class SQLitePersistence(BasePersistence):
+    def __init__(self, db, update_interval=10):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval
+        )
+        self.db = db
+        self._loaded_users = set()
+        self._staged_users = {}
+        self._staged_conversations = {}
+        self._pending_flush = None
+        self._previous_flush = None
+
+    # --- القراءة ---
+    async def get_user_data(self):
+        # التحميل كسول: refresh_user_data تجلب بيانات كل مستخدم عند أول وصول
+        return {}
+
+    async def refresh_user_data(self, user_id, user_data):
+        if user_id in self._loaded_users:
+            return
+        self._loaded_users.add(user_id)
+        row = await self.db.fetchone("SELECT data FROM user_state WHERE user_id=?", (user_id,))
+        if row and not user_data:
+            user_data.update(json.loads(row[0]))
+
+    async def get_conversations(self, name):
+        rows = await self.db.fetchall("SELECT key, state FROM conversation_state WHERE name=?", (name,))
+        return {tuple(json.loads(key)): state for key, state in rows}
+
+    async def get_chat_data(self):
+        return {}
+
+    async def get_bot_data(self):
+        return {}
+
+    async def get_callback_data(self):
+        return None
+
+    async def refresh_chat_data(self, chat_id, chat_data):
+        pass
+
+    async def refresh_bot_data(self, bot_data):
+        pass
+
+    # --- الكتابة المجمّعة ---
+    async def update_user_data(self, user_id, data):
+        self._loaded_users.add(user_id)
+        self._staged_users[user_id] = json.dumps(data, ensure_ascii=False, default=str)
+        await self._schedule_flush()
+
+    async def drop_user_data(self, user_id):
+        self._staged_users[user_id] = None
+        await self._schedule_flush()
+
+    async def update_conversation(self, name, key, new_state):
+        self._staged_conversations[(name, json.dumps(list(key)))] = new_state
+        await self._schedule_flush()
+
+    async def update_chat_data(self, chat_id, data):
+        pass
+
+    async def drop_chat_data(self, chat_id):
+        pass
+
+    async def update_bot_data(self, data):
+        pass
+
+    async def update_callback_data(self, data):
+        pass
+
+    async def _schedule_flush(self):
+        # كل استدعاءات update_* التي تصل قبل بدء الكتابة تنتظر كتابة واحدة مشتركة
+        if self._pending_flush is None:
+            self._pending_flush = asyncio.create_task(self._write_staged(self._previous_flush))
+            self._previous_flush = self._pending_flush
+        await asyncio.shield(self._pending_flush)
+
+    async def _write_staged(self, previous):
+        # ننتظر الكتابة السابقة حتى تبقى الكتابات بالترتيب، ثم نأخذ كل ما تكدّس
+        if previous is not None:
+            await asyncio.wait([previous])
+        else:
+            await asyncio.sleep(0)
+        self._pending_flush = None
+        users, self._staged_users = self._staged_users, {}
+        conversations, self._staged_conversations = self._staged_conversations, {}
+        if not users and not conversations:
+            return
+
+        def _write(conn):
+            conn.executemany(
+                "INSERT INTO user_state (user_id, data) VALUES (?, ?) "
+                "ON CONFLICT (user_id) DO UPDATE SET data = excluded.data",
+                [(user_id, data) for user_id, data in users.items() if data is not None])
+            conn.executemany("DELETE FROM user_state WHERE user_id=?",
+                             [(user_id,) for user_id, data in users.items() if data is None])
+            conn.executemany(
+                "INSERT INTO conversation_state (name, key, state) VALUES (?, ?, ?) "
+                "ON CONFLICT (name, key) DO UPDATE SET state = excluded.state",
+                [(name, key, state) for (name, key), state in conversations.items() if state is not None])
+            conn.executemany("DELETE FROM conversation_state WHERE name=? AND key=?",
+                             [(name, key) for (name, key), state in conversations.items() if state is None])
+
+        await self.db.run(_write)
+
+    async def flush(self):
+        if self._staged_users or self._staged_conversations:
+            await self._schedule_flush()
+        elif self._previous_flush is not None:
+            await asyncio.wait([self._previous_flush])
@@ -0,0 +1,75 @@
+import asyncio
+import logging
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+# --- طبقة التخزين غير المتزامنة ---
+# اتصال واحد طويل العمر لكل قاعدة بيانات يعمل على خيط منفصل،
+# بحيث لا تنتظر حلقة الأحداث أي عملية قراءة أو كتابة على القرص.
+# observer(wait, duration, ok) اختياري: يُستدعى بعد كل معاملة بزمن انتظارها في
+# طابور الاتصال وزمن تنفيذها (يشمل انتظار أقفال SQLite من العمليات الأخرى).
+class Database:
+    def __init__(self, path, busy_timeout=5000, observer=None):
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self.observer = observer
+        self._conn = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"sqlite:{path}")
+
+    def _connect(self):
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout / 1000, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout)}")
+            self._conn = conn
+        return self._conn
+
+    def _call(self, submitted, fn, *args):
+        started = time.perf_counter()
+        ok = False
+        conn = self._connect()
+        try:
+            result = fn(conn, *args)
+            conn.commit()
+            ok = True
+            return result
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            if self.observer is not None:
+                self.observer(started - submitted, time.perf_counter() - started, ok)
+
+    def run_sync(self, fn, *args):
+        # للاستخدام خارج حلقة الأحداث فقط (التهيئة وأدوات سطر الأوامر)
+        return self._executor.submit(self._call, time.perf_counter(), fn, *args).result()
+
+    async def run(self, fn, *args):
+        # تنفيذ دالة كاملة fn(conn, ...) داخل معاملة واحدة على خيط قاعدة البيانات
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._call, time.perf_counter(), fn, *args)
+
+    async def execute(self, sql, params=()):
+        return await self.run(lambda conn: conn.execute(sql, params).rowcount)
+
+    async def fetchone(self, sql, params=()):
+        return await self.run(lambda conn: conn.execute(sql, params).fetchone())
+
+    async def fetchall(self, sql, params=()):
+        return await self.run(lambda conn: conn.execute(sql, params).fetchall())
+
+    def close(self):
+        def _close():
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+        try:
+            self._executor.submit(_close).result()
+        finally:
+            self._executor.shutdown(wait=True)
@@ -0,0 +1,34 @@
+import importlib
+import os
+
+import pytest
+
+import availability
+import migrations
+from storage import Database
+
+
+@pytest.fixture(scope="session")
+def bot2_module(tmp_path_factory):
+    # bot2 يفتح bookings.db و admins.db في المجلد الحالي عند الاستيراد
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp("bot2"))
+    os.environ.setdefault("BOT_TOKEN", "123456789:TEST")
+    try:
+        module = importlib.import_module("bot2")
+    finally:
+        os.chdir(cwd)
+    yield module
+    module.close_databases()
+
+
+@pytest.fixture
+def bot2(bot2_module, tmp_path, monkeypatch):
+    # قاعدة حجوزات جديدة مرحَّلة لكل اختبار
+    db = Database(f"{tmp_path}/bookings.db")
+    db.run_sync(migrations.migrate_bookings)
+    monkeypatch.setattr(bot2_module, "bookings_db", db)
+    monkeypatch.setattr(bot2_module, "occupancy_grid",
+                        availability.OccupancyGrid(db, bot2_module.CAPACITY, bot2_module.CALENDAR_DAYS))
+    yield bot2_module
+    db.close()
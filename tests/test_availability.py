@@ -0,0 +1,61 @@
+import asyncio
+import sqlite3
+import time
+from datetime import date
+
+import migrations
+from availability import OccupancyGrid, read_cells
+from storage import Database
+
+
+def test_grid_tracks_local_and_external_writes(tmp_path):
+    async def check():
+        db = Database(f"{tmp_path}/bookings.db")
+        other = sqlite3.connect(f"{tmp_path}/bookings.db")
+        try:
+            await db.run(migrations.migrate_bookings)
+            today = date(2030, 1, 1)
+            grid = OccupancyGrid(db, {"bar": 30, "kids_pool": 40}, days=3)
+            await grid.load(today)
+            assert grid.calendar("bar") == [("2030-01-01", 30), ("2030-01-02", 30), ("2030-01-03", 30)]
+
+            def book(conn):
+                conn.execute("INSERT INTO bookings (location, people, booking_date) VALUES ('bar', 4, '2030-01-02')")
+                return read_cells(conn, [("bar", "2030-01-02")])
+
+            grid.apply(await db.run(book))
+            grid.hold(7, "bar", "2030-01-02", 5, time.time() + 60)
+            assert grid.remaining("bar", "2030-01-02") == 21
+            assert grid.remaining("bar", "2030-01-02", user_id=7) == 26
+            assert not await grid.refresh(today)
+
+            # كتابة من اتصال آخر (عامل آخر) تُكتشف عبر data_version
+            other.execute("INSERT INTO bookings (location, people, booking_date) VALUES ('bar', 10, '2030-01-03')")
+            other.commit()
+            assert await grid.refresh(today)
+            assert grid.calendar("bar")[2] == ("2030-01-03", 20)
+            assert grid.remaining("bar", "2030-01-02") == 26  # الحجز المؤقت 7 لم يكن في القاعدة
+        finally:
+            other.close()
+            db.close()
+
+    asyncio.run(check())
+
+
+def test_calendar_ignores_expired_and_own_holds(tmp_path):
+    async def check():
+        db = Database(f"{tmp_path}/bookings.db")
+        try:
+            await db.run(migrations.migrate_bookings)
+            grid = OccupancyGrid(db, {"bar": 30}, days=2)
+            await grid.load(date(2030, 1, 1))
+            grid.hold(1, "bar", "2030-01-01", 6, time.time() + 60)
+            grid.hold(2, "bar", "2030-01-01", 8, time.time() - 1)
+            assert grid.calendar("bar") == [("2030-01-01", 24), ("2030-01-02", 30)]
+            assert grid.calendar("bar", user_id=1) == [("2030-01-01", 30), ("2030-01-02", 30)]
+            grid.release(1)
+            assert grid.remaining("bar", "2030-01-01") == 30
+        finally:
+            db.close()
+
+    asyncio.run(check())
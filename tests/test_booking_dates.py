@@ -0,0 +1,9 @@
+from datetime import date
+
+
+def test_past_and_far_dates_are_refused(bot2, monkeypatch):
+    monkeypatch.setattr(bot2, "get_today", lambda: date(2030, 1, 10))
+    assert bot2.booking_date_error(date(2030, 1, 10)) is None
+    assert bot2.booking_date_error(date(2030, 4, 10)) is None  # بعد 90 يوماً بالضبط
+    assert "مضى" in bot2.booking_date_error(date(2030, 1, 9))
+    assert bot2.booking_date_error(date(2030, 4, 11)) is not None
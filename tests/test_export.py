@@ -0,0 +1,18 @@
+import csv
+
+from export import CsvSink, escape_formulas
+
+
+def test_formula_cells_are_escaped():
+    rows = [('=HYPERLINK("x")', "+1", "-2", "@SUM(A1)", "أحمد", -5, None)]
+    assert list(escape_formulas(rows)) == [
+        ["'=HYPERLINK(\"x\")", "'+1", "'-2", "'@SUM(A1)", "أحمد", -5, None]]
+
+
+def test_csv_sink_writes_escaped_names(tmp_path):
+    path = tmp_path / "bookings.csv"
+    sink = CsvSink(path)
+    sink.write([("SHAM1", "=1+1", 100)])
+    sink.close()
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        assert list(csv.reader(f))[1] == ["SHAM1", "'=1+1", "100"]
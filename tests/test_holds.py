@@ -0,0 +1,65 @@
+import asyncio
+import multiprocessing
+import os
+import random
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import migrations
+
+PROCESSES = 4
+USERS_PER_PROCESS = 25
+SLOT = ("bar", "2030-01-01")
+
+
+def place_holds(workdir, users):
+    # عملية عامل مستقلة: bot2 يفتح قاعدة البيانات نفسها في workdir باتصاله الخاص
+    os.chdir(workdir)
+    os.environ.setdefault("BOT_TOKEN", "123456789:TEST")
+    import bot2
+
+    async def run():
+        return await asyncio.gather(*(bot2.place_hold(user_id, *SLOT, people) for user_id, people in users))
+
+    try:
+        held = asyncio.run(run())
+    finally:
+        bot2.close_databases()
+    return [user for user, ok in zip(users, held) if ok]
+
+
+def test_concurrent_holds_never_exceed_capacity(bot2, tmp_path):
+    conn = sqlite3.connect(tmp_path / "bookings.db")
+    migrations.migrate_bookings(conn)
+    # مقاعد محجوزة فعلاً تُحسب مع الحجوزات المؤقتة
+    conn.execute("INSERT INTO bookings (payment_code, location, people, status, booking_date) "
+                 "VALUES ('SHAM0', ?, 5, 'approved', ?)", SLOT)
+    conn.commit()
+
+    rng = random.Random(1)
+    batches = [[(1000 * p + i, rng.randint(1, 4)) for i in range(USERS_PER_PROCESS)] for p in range(PROCESSES)]
+    spawn = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=PROCESSES, mp_context=spawn) as executor:
+        granted = [user for held in executor.map(place_holds, [str(tmp_path)] * PROCESSES, batches) for user in held]
+
+    held_people = conn.execute("SELECT SUM(people) FROM seat_holds WHERE location=? AND booking_date=? "
+                               "AND expires_at > ?", (*SLOT, time.time())).fetchone()[0]
+    conn.close()
+    assert held_people == sum(people for _, people in granted)
+    assert 5 + held_people <= bot2.CAPACITY[SLOT[0]]
+    # الطلب (حوالي 250 مقعداً) أكبر بكثير من السعة: الحجوزات المؤقتة ملأت ما تبقى تقريباً
+    assert 5 + held_people > bot2.CAPACITY[SLOT[0]] - 4
+
+
+def test_expired_hold_is_not_booked(bot2):
+    async def check():
+        assert await bot2.place_hold(7, *SLOT, 3)
+        await bot2.bookings_db.execute("UPDATE seat_holds SET expires_at = ? WHERE user_id = 7", (time.time() - 1,))
+        data = {"payment_code": "SHAM7", "name": "ضيف", "location": SLOT[0], "booking_date": SLOT[1],
+                "people": 3, "amount": 30000, "transfer_number": "T7", "user_id": 7}
+        assert await bot2.save_booking(data, None) == bot2.BOOKING_NOT_SAVED
+        assert await bot2.bookings_db.fetchone("SELECT COUNT(*) FROM bookings") == (0,)
+        assert await bot2.bookings_db.fetchone("SELECT COUNT(*) FROM seat_holds") == (0,)
+
+    asyncio.run(check())
@@ -0,0 +1,66 @@
+import io
+import json
+import logging
+
+import pytest
+
+from log_queue import SamplingFilter, setup_logging, update_context
+
+
+@pytest.fixture(autouse=True)
+def restore_root_logger():
+    # setup_logging يستبدل معالجات الجذر؛ تُعاد كما كانت لبقية الاختبارات
+    root = logging.getLogger()
+    handlers, level, srcfile = root.handlers[:], root.level, logging._srcfile
+    yield
+    root.handlers[:] = handlers
+    root.setLevel(level)
+    logging._srcfile = srcfile
+
+
+def test_records_are_written_by_listener_and_sampled():
+    stream = io.StringIO()
+    listener = setup_logging(fmt="json", sample_every=10, stream=stream)
+    calls = 1000
+    listener.stop()  # السجلات تبقى في الطابور حتى يبدأ خيط الكتابة
+    for i in range(calls):
+        logging.getLogger("bench").info("حجز %s", i)
+    for i in range(calls):
+        logging.getLogger("httpx").info("HTTP Request: POST %s", i)
+    logging.getLogger("httpx").warning("تحذير")
+    listener.start()
+    listener.stop()
+
+    lines = stream.getvalue().splitlines()
+    assert len(lines) == calls + calls // 10 + 1
+    assert json.loads(lines[1])["message"] == "حجز 1"
+    assert json.loads(lines[-1])["level"] == "WARNING"
+
+
+def test_update_context_and_extra_fields():
+    stream = io.StringIO()
+    token = update_context.set(("start", 42))
+    listener = setup_logging(fmt="json", stream=stream)
+    try:
+        logging.getLogger("bench").warning("x", extra={"latency_ms": 1.5})
+    finally:
+        listener.stop()
+        update_context.reset(token)
+    assert json.loads(stream.getvalue()) | {"ts": None} == {
+        "ts": None, "level": "WARNING", "logger": "bench", "message": "x",
+        "handler": "start", "user_id": 42, "latency_ms": 1.5}
+
+
+def test_text_format_appends_fields():
+    stream = io.StringIO()
+    listener = setup_logging(fmt="text", stream=stream)
+    logging.getLogger("bench").warning("بطيء", extra={"handler": "find_command", "latency_ms": 700})
+    listener.stop()
+    assert stream.getvalue().rstrip().endswith("بطيء [handler=find_command latency_ms=700]")
+
+
+def test_sampling_filter_passes_other_loggers():
+    sampling = SamplingFilter(every=3)
+    record = logging.LogRecord("httpx", logging.INFO, __file__, 1, "x", None, None)
+    assert [sampling.filter(record) for _ in range(4)] == [True, False, False, True]
+    assert sampling.filter(logging.LogRecord("bot2", logging.INFO, __file__, 1, "x", None, None))
@@ -0,0 +1,30 @@
+import asyncio
+
+BOOKING_SQL = ("INSERT INTO bookings (payment_code, user_id, location, people, status, booking_date) "
+               "VALUES (?, 5, 'bar', 2, 'pending', '2030-01-01')")
+
+
+def test_approve_then_reject_keeps_approval(bot2):
+    async def check():
+        await bot2.bookings_db.execute(BOOKING_SQL, ("SHAM1",))
+        assert await bot2.approve_booking("SHAM1") == bot2.BOOKING_MODERATED
+        # زر ❌ قديم من /find بعد الموافقة
+        assert await bot2.reject_booking("SHAM1", "سبب") == bot2.ALREADY_PROCESSED
+        assert await bot2.approve_booking("SHAM1") == bot2.ALREADY_PROCESSED
+        assert await bot2.reject_booking("SHAM404") == bot2.BOOKING_NOT_FOUND
+        status = await bot2.bookings_db.fetchone("SELECT status FROM bookings WHERE payment_code='SHAM1'")
+        occupancy = await bot2.bookings_db.fetchone("SELECT people FROM occupancy")
+        outbox = await bot2.bookings_db.fetchone("SELECT COUNT(*) FROM outbox")
+        assert (status, occupancy, outbox) == (("approved",), (2,), (1,))
+
+    asyncio.run(check())
+
+
+def test_reject_pending_frees_seats(bot2):
+    async def check():
+        await bot2.bookings_db.execute(BOOKING_SQL, ("SHAM2",))
+        assert await bot2.reject_booking("SHAM2") == bot2.BOOKING_MODERATED
+        assert await bot2.approve_booking("SHAM2") == bot2.ALREADY_PROCESSED
+        assert await bot2.bookings_db.fetchone("SELECT people FROM occupancy") == (0,)
+
+    asyncio.run(check())
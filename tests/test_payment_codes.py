@@ -0,0 +1,52 @@
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from payment_codes import PaymentCodeGenerator
+
+# أبجدية Crockford Base32 التي يستخدمها المولد: بدون I L O U
+CODE_PATTERN = re.compile(r"SHAM[0-9A-HJKMNP-TV-Z]{13}")
+PROCESSES = 4
+THREADS = 4
+PER_PROCESS = 500_000  # 2,000,000 كود إجمالاً، كما في اختبار الضغط الأصلي
+
+
+def generate(node_id, count=PER_PROCESS, threads=THREADS):
+    # مولد واحد مشترك بين عدة خيوط، كما في العامل الواحد
+    generator = PaymentCodeGenerator(node_id)
+    per_thread = count // threads
+    results = [None] * threads
+
+    def worker(index):
+        results[index] = [generator.next() for _ in range(per_thread)]
+
+    pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    return [code for chunk in results for code in chunk]
+
+
+def test_codes_unique_across_threads():
+    codes = generate(node_id=1, count=200_000)
+    assert len(codes) == 200_000
+    assert len(set(codes)) == len(codes)
+
+
+def test_codes_unique_across_processes():
+    # عمليات بأرقام عقد مختلفة، كل منها بعدة خيوط
+    with ProcessPoolExecutor(max_workers=PROCESSES) as executor:
+        batches = list(executor.map(generate, range(PROCESSES)))
+    codes = [code for batch in batches for code in batch]
+    assert len(codes) == PROCESSES * PER_PROCESS
+    assert len(set(codes)) == len(codes)
+    assert all(CODE_PATTERN.fullmatch(code) for code in codes)
+
+
+def test_sequence_overflow_borrows_next_millisecond():
+    generator = PaymentCodeGenerator(node_id=7)
+    # أكثر من 4096 كوداً في الميلي ثانية نفسها تقريباً
+    codes = [generator.next() for _ in range(20_000)]
+    assert len(set(codes)) == len(codes)
+    assert codes == sorted(codes)
@@ -0,0 +1,76 @@
+import asyncio
+
+import pytest
+from telegram.ext import Application, MessageHandler, filters
+
+from bench.fake_bot_api import FakeBotAPI, WebhookPusher, make_message_update
+import webhook
+import workers
+from webhook import WebhookServer, start_application, stop_application
+
+TOKEN = "123456789:TEST"
+SECRET = "test-secret"
+
+
+async def run_webhook(updates, secret_token):
+    # FakeBotAPI يجيب على getMe عند التهيئة؛ التحديثات تصل عبر WebhookServer وحده
+    api = FakeBotAPI()
+    await api.start()
+    application = Application.builder().token(TOKEN).base_url(api.base_url).updater(None).build()
+    handled = []
+    done = asyncio.Event()
+
+    async def record(update, context):
+        handled.append(update.update_id)
+        if len(handled) == len(updates):
+            done.set()
+
+    application.add_handler(MessageHandler(filters.TEXT, record))
+    server = WebhookServer(application, "telegram", secret_token=SECRET, listen="127.0.0.1", port=0)
+    await start_application(application)
+    await server.start()
+    pusher = WebhookPusher(f"http://127.0.0.1:{server.port}/telegram", secret_token, connections=4)
+    error = None
+    try:
+        try:
+            await pusher.push(updates)
+        except RuntimeError as exc:
+            # الدافع يتوقف عند أول رد غير 200
+            error = str(exc)
+        else:
+            await asyncio.wait_for(done.wait(), timeout=10)
+    finally:
+        await server.stop()
+        await stop_application(application)
+        await api.stop()
+    return server, pusher, handled, error
+
+
+def test_recorded_updates_are_handled():
+    updates = [make_message_update(i + 1, 1000 + i % 7, "📅 حجز طاولة") for i in range(50)]
+    server, pusher, handled, error = asyncio.run(run_webhook(updates, SECRET))
+    assert error is None
+    assert pusher.delivered == server.received == len(updates)
+    assert sorted(handled) == [update["update_id"] for update in updates]
+    assert server.rejected == 0
+
+
+def test_wrong_secret_token_is_rejected():
+    updates = [make_message_update(1, 1000, "📅 حجز طاولة")]
+    server, pusher, handled, error = asyncio.run(run_webhook(updates, "wrong-secret"))
+    assert error.startswith("HTTP/1.1 403")
+    assert server.rejected == 1
+    assert server.received == pusher.delivered == 0
+    assert handled == []
+
+
+def test_webhook_mode_requires_url_and_secret():
+    application = Application.builder().token(TOKEN).updater(None).build()
+    with pytest.raises(ValueError, match="WEBHOOK_SECRET"):
+        asyncio.run(webhook.run_webhook(application, "https://example.com/telegram", "telegram", secret_token=None))
+    with pytest.raises(ValueError, match="WEBHOOK_URL"):
+        asyncio.run(webhook.run_webhook(application, "", "telegram", secret_token=SECRET))
+    with pytest.raises(ValueError, match="WEBHOOK_SECRET"):
+        asyncio.run(workers.run_sharded_webhook(
+            None, None, 2, TOKEN, "http://127.0.0.1:1/bot", "https://example.com/telegram", "telegram",
+            secret_token=""))
@@ -0,0 +1,100 @@
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup
+
+
+# --- لوحات مفاتيح تُحوَّل إلى JSON مرة واحدة ---
+# كائنات PTB مجمدة أصلاً بعد الإنشاء، فيمكن مشاركتها بين كل الرسائل. هذه النسخة
+# تحفظ ناتج to_dict عند الإنشاء بدل بنائه من جديد مع كل طلب إرسال.
+def _serialized_once(markup_class):
+    class Frozen(markup_class):
+        __slots__ = ("_serialized",)
+
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            with self._unfrozen():
+                self._serialized = super().to_dict()
+
+        def to_dict(self, recursive=True):
+            return self._serialized if recursive else super().to_dict(recursive=False)
+
+    Frozen.__name__ = Frozen.__qualname__ = f"Frozen{markup_class.__name__}"
+    return Frozen
+
+
+FrozenReplyKeyboardMarkup = _serialized_once(ReplyKeyboardMarkup)
+FrozenInlineKeyboardMarkup = _serialized_once(InlineKeyboardMarkup)
+
+
+# --- القائمة الرئيسية ---
+MAIN_MENU_ROWS = (
+    ("🏊 المسابح", "🍽️ المطاعم"),
+    ("🎉 العروض الخاصة", "📞 اتصل بنا"),
+    ("📅 حجز طاولة", "🆔 معرفي"),
+)
+ADMIN_MENU_ROWS = MAIN_MENU_ROWS + (("📋 الحجوزات الموافق عليها",),)
+
+MAIN_MENU = FrozenReplyKeyboardMarkup(MAIN_MENU_ROWS, resize_keyboard=True,
+                                      input_field_placeholder="اختر من القائمة...")
+ADMIN_MAIN_MENU = FrozenReplyKeyboardMarkup(ADMIN_MENU_ROWS, resize_keyboard=True,
+                                            input_field_placeholder="اختر من القائمة...")
+
+
+def main_menu(admin=False):
+    return ADMIN_MAIN_MENU if admin else MAIN_MENU
+
+
+# --- مسار الحجز ---
+LOCATION_LABELS = {
+    "bar": "بار",
+    "winter_pool": "جانب المسبح الشتوي",
+    "kids_pool": "جانب مسبح الأطفال",
+    "summer_pool": "جانب المسبح الصيفي",
+    "hall_side": "مقابل الصالة",
+}
+
+LOCATION_KEYBOARD = FrozenInlineKeyboardMarkup(
+    [[InlineKeyboardButton(label, callback_data=location)] for location, label in LOCATION_LABELS.items()]
+)
+
+# أسماء الأيام بترتيب date.weekday() (الاثنين = 0) لأزرار تقويم الحجز
+WEEKDAYS = ("الاثنين", "الثلاثاء", "الأربعاء", "الخميس", "الجمعة", "السبت", "الأحد")
+FULL_DAY = "⛔"
+
+CONFIRM_KEYBOARD = FrozenInlineKeyboardMarkup([
+    [InlineKeyboardButton("✅ تأكيد الحجز", callback_data='confirm')],
+    [InlineKeyboardButton("❌ إلغاء", callback_data='cancel')]
+])
+
+# --- الإشراف الجماعي على الحجوزات المعلقة ---
+# حالة التحديد محفوظة في نص زر pick_<code> نفسه داخل الرسالة، فلا تحتاج ذاكرة جلسة.
+PICK = "☐ تحديد"
+PICKED = "☑️ محدد"
+BULK_ROW = (
+    InlineKeyboardButton("✅ موافقة على المحدد", callback_data="bulk_approve"),
+    InlineKeyboardButton("❌ رفض المحدد", callback_data="bulk_reject"),
+)
+
+# --- النصوص الثابتة ---
+WELCOME_HEADER = """
+✨ مرحباً بك في واحة الشام ✨
+📅 التاريخ الحالي: {date}
+
+"""
+
+WELCOME_FOOTER = """
+📍 خياراتنا المتاحة:
+- مسابح نظيفة بمواصفات عالية
+- مطعم رئيسي يقدم وجبات متنوعة
+
+اختر من القائمة:
+"""
+
+ASK_LOCATION = "📍 اختر موقع الطاولة:"
+ASK_DATE = (
+    "📅 اختر تاريخ الحجز (الرقم بجانب كل يوم هو عدد المقاعد المتبقية)،\n"
+    "أو اكتب التاريخ بالصيغة YYYY-MM-DD:"
+)
+CANCELLED = "تم إلغاء العملية"
+UNKNOWN_COMMAND = (
+    "عذراً، لا أفهم هذا الأمر.\n"
+    "الرجاء استخدام الأزرار المتاحة أو كتابة /start للبدء من جديد."
+)
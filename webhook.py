@@ -0,0 +1,192 @@
+import asyncio
+import hmac
+import json
+import logging
+import signal
+
+from telegram import Update
+
+logger = logging.getLogger(__name__)
+
+REASONS = {200: "OK", 400: "Bad Request", 403: "Forbidden", 404: "Not Found", 413: "Payload Too Large"}
+
+
+# --- خادم Webhook خفيف ---
+# يستقبل التحديثات من تيليغرام مباشرة، يتحقق من الرمز السري، ويضعها في
+# Application.update_queue دون المرور بحلقة getUpdates. يدعم keep-alive
+# ويعرض عمق الطابور على GET /healthz والمقاييس بصيغة Prometheus على GET /metrics.
+class WebhookServer:
+    def __init__(self, application, path, secret_token=None, listen="0.0.0.0", port=8443, max_body=1 << 20,
+                 metrics=None):
+        self.application = application
+        self.metrics = metrics
+        self.path = "/" + path.lstrip("/")
+        self.secret_token = secret_token
+        self.listen = listen
+        self.port = port
+        self.max_body = max_body
+        self.received = 0
+        self.rejected = 0
+        self._server = None
+
+    @property
+    def queue_depth(self):
+        return self.application.update_queue.qsize()
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.listen, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info(f"🌐 خادم Webhook يعمل على {self.listen}:{self.port}{self.path}")
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _route(self, method, target, headers, body):
+        if method == "GET" and target == "/healthz":
+            return 200, {"queue_depth": self.queue_depth, "received": self.received, "rejected": self.rejected}
+        if method == "GET" and target == "/metrics" and self.metrics is not None:
+            return 200, self.metrics.render_prometheus()
+        if target != self.path:
+            return 404, {"ok": False}
+        if method != "POST":
+            return 404, {"ok": False}
+
+        if self.secret_token is not None and not hmac.compare_digest(
+                headers.get("x-telegram-bot-api-secret-token", ""), self.secret_token):
+            self.rejected += 1
+            return 403, {"ok": False}
+
+        try:
+            await self.accept(json.loads(body))
+        except (ValueError, TypeError, KeyError, AttributeError):
+            self.rejected += 1
+            return 400, {"ok": False}
+
+        self.received += 1
+        return 200, {"ok": True}
+
+    async def accept(self, data):
+        await self.application.update_queue.put(Update.de_json(data, self.application.bot))
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except asyncio.IncompleteReadError:
+                    break
+                request_line, *header_lines = head.decode("latin-1").split("\r\n")
+                method, target, _ = request_line.split(" ", 2)
+
+                headers = {}
+                for line in header_lines:
+                    name, _, value = line.partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get("content-length", 0))
+                if length > self.max_body:
+                    self._respond(writer, 413, {"ok": False}, keep_alive=False)
+                    await writer.drain()
+                    break
+                body = await reader.readexactly(length) if length else b""
+
+                status, payload = await self._route(method, target, headers, body)
+                keep_alive = headers.get("connection", "").lower() != "close"
+                self._respond(writer, status, payload, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    def _respond(writer, status, payload, keep_alive):
+        if isinstance(payload, str):
+            body, content_type = payload.encode(), "text/plain; version=0.0.4"
+        else:
+            body, content_type = json.dumps(payload).encode(), "application/json"
+        writer.write(
+            f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + body
+        )
+
+
+# --- دورة حياة التطبيق بدون Updater ---
+# تُستخدم هنا وفي العمال (workers.py) حيث تصل التحديثات من مصدر خارجي.
+async def start_application(application):
+    await application.initialize()
+    if application.post_init:
+        await application.post_init(application)
+    await application.start()
+
+
+async def stop_application(application):
+    await application.stop()
+    if application.post_stop:
+        await application.post_stop(application)
+    await application.shutdown()
+    if application.post_shutdown:
+        await application.post_shutdown(application)
+
+
+def stop_signal():
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except (NotImplementedError, RuntimeError):
+            pass
+    return stop_event
+
+
+# بدون رمز سري يستطيع أي أحد يعرف العنوان إرسال تحديثات مزوّرة بأي from.id (ومنها
+# معرفات المسؤولين)، و set_webhook(url="") يحذف الـ Webhook فيبقى البوت بلا تحديثات
+def check_webhook_config(webhook_url, secret_token):
+    if not webhook_url:
+        raise ValueError("وضع Webhook يتطلب WEBHOOK_URL")
+    if not secret_token:
+        raise ValueError("وضع Webhook يتطلب WEBHOOK_SECRET")
+
+
+async def set_webhook(bot, webhook_url, secret_token=None, max_connections=40):
+    # لا نحذف التحديثات المعلقة: تيليغرام يسلّم ما تراكم أثناء إعادة التشغيل
+    await bot.set_webhook(
+        url=webhook_url,
+        secret_token=secret_token,
+        max_connections=max_connections,
+        allowed_updates=Update.ALL_TYPES,
+        drop_pending_updates=False
+    )
+
+
+async def serve_until_stopped(server, stop_event, report_interval=60):
+    while not stop_event.is_set():
+        try:
+            await asyncio.wait_for(stop_event.wait(), timeout=report_interval)
+        except asyncio.TimeoutError:
+            logger.info(f"📥 Webhook: عمق الطابور {server.queue_depth}، المستلم {server.received}")
+
+
+async def run_webhook(application, webhook_url, path, secret_token=None, listen="0.0.0.0", port=8443,
+                      max_connections=40, report_interval=60, metrics=None):
+    check_webhook_config(webhook_url, secret_token)
+    server = WebhookServer(application, path, secret_token, listen, port, metrics=metrics)
+    stop_event = stop_signal()
+
+    await start_application(application)
+    await server.start()
+    await set_webhook(application.bot, webhook_url, secret_token, max_connections)
+
+    try:
+        await serve_until_stopped(server, stop_event, report_interval)
+    finally:
+        await server.stop()
+        await stop_application(application)
@@ -0,0 +1,214 @@
+import asyncio
+import json
+import logging
+import multiprocessing
+import queue
+import signal
+import threading
+
+from telegram import Bot, Update
+
+import webhook
+
+logger = logging.getLogger(__name__)
+
+# عمليات العمال تبدأ بـ spawn: كل عامل يستورد البوت من جديد بخيوط واتصالات SQLite خاصة به
+_mp = multiprocessing.get_context("spawn")
+
+
+# --- توجيه التحديثات حسب المستخدم ---
+# كل تحديثات المستخدم نفسه تذهب إلى العامل نفسه، فيبقى ترتيب محادثته
+# (ConversationHandler بـ per_user) وحالتها في عملية واحدة.
+def shard_key(data):
+    for name, value in data.items():
+        if name == "update_id" or not isinstance(value, dict):
+            continue
+        user = value.get("from") or value.get("user")
+        if user:
+            return user["id"]
+        chat = value.get("chat")
+        if chat:
+            return chat["id"]
+    return 0
+
+
+def shard_for(data, workers):
+    return hash(shard_key(data)) % workers
+
+
+# --- العامل ---
+# تطبيق كامل (build_application) يقرأ التحديثات الخام من أنبوب بخيط منفصل
+# ويضعها في update_queue بالترتيب الذي وصلت به. رسالة فارغة تعني الإيقاف.
+def worker_main(index, factory, cleanup, conn, accepted, ready):
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    application = factory()
+    try:
+        asyncio.run(_serve_worker(index, application, conn, accepted, ready))
+    finally:
+        cleanup()
+
+
+async def _serve_worker(index, application, conn, accepted, ready):
+    loop = asyncio.get_running_loop()
+    stopped = asyncio.Event()
+
+    def feed(raw):
+        if not raw:
+            stopped.set()
+            return
+        application.update_queue.put_nowait(Update.de_json(json.loads(raw), application.bot))
+        accepted[index] += 1
+
+    def read():
+        try:
+            while True:
+                raw = conn.recv_bytes()
+                loop.call_soon_threadsafe(feed, raw)
+                if not raw:
+                    break
+        except (EOFError, OSError):
+            loop.call_soon_threadsafe(feed, b"")
+
+    await webhook.start_application(application)
+    threading.Thread(target=read, name=f"shard-{index}", daemon=True).start()
+    ready.release()
+    logger.info(f"👷 العامل {index} جاهز")
+    try:
+        await stopped.wait()
+    finally:
+        await webhook.stop_application(application)
+
+
+# --- موجّه العمال ---
+# يشغّل N عملية ويمرر لكل منها تحديثاتها. الكتابة في الأنبوب تتم من خيط لكل
+# عامل حتى لا يوقف عامل بطيء حلقة الأحداث في الموجّه أو بقية العمال.
+class ShardRouter:
+    def __init__(self, factory, cleanup, workers):
+        self.factory = factory
+        self.cleanup = cleanup
+        self.workers = workers
+        self.forwarded = [0] * workers
+        self._accepted = _mp.Array("q", workers, lock=False)
+        self._ready = _mp.Semaphore(0)
+        self._processes = []
+        self._outgoing = []
+        self._senders = []
+
+    @property
+    def backlog(self):
+        return [sent - accepted for sent, accepted in zip(self.forwarded, self._accepted)]
+
+    async def start(self):
+        for index in range(self.workers):
+            receiver, sender = _mp.Pipe(duplex=False)
+            process = _mp.Process(
+                target=worker_main,
+                args=(index, self.factory, self.cleanup, receiver, self._accepted, self._ready),
+                name=f"bot-worker-{index}"
+            )
+            process.start()
+            receiver.close()
+            outgoing = queue.SimpleQueue()
+            thread = threading.Thread(target=self._send_loop, args=(sender, outgoing), daemon=True)
+            thread.start()
+            self._processes.append(process)
+            self._outgoing.append(outgoing)
+            self._senders.append(thread)
+
+        loop = asyncio.get_running_loop()
+        for _ in range(self.workers):
+            await loop.run_in_executor(None, self._ready.acquire)
+        logger.info(f"🚀 {self.workers} عمال جاهزون")
+
+    @staticmethod
+    def _send_loop(sender, outgoing):
+        try:
+            while True:
+                raw = outgoing.get()
+                sender.send_bytes(raw)
+                if not raw:
+                    break
+        except OSError:
+            pass
+        finally:
+            sender.close()
+
+    def dispatch(self, data):
+        index = shard_for(data, self.workers)
+        self._outgoing[index].put(json.dumps(data).encode())
+        self.forwarded[index] += 1
+
+    async def stop(self):
+        for outgoing in self._outgoing:
+            outgoing.put(b"")
+        loop = asyncio.get_running_loop()
+        for process in self._processes:
+            await loop.run_in_executor(None, process.join)
+
+
+class ShardedWebhookServer(webhook.WebhookServer):
+    def __init__(self, router, path, secret_token=None, listen="0.0.0.0", port=8443, max_body=1 << 20):
+        super().__init__(None, path, secret_token, listen, port, max_body)
+        self.router = router
+
+    @property
+    def queue_depth(self):
+        return sum(self.router.backlog)
+
+    async def accept(self, data):
+        if not isinstance(data, dict) or "update_id" not in data:
+            raise ValueError("not an update")
+        self.router.dispatch(data)
+
+
+# --- الوضع متعدد العمال ---
+# الموجّه يستقبل التحديثات (Webhook أو getUpdates) ولا ينفذ أي معالج؛ العمال
+# يتشاركون قواعد البيانات نفسها (WAL): فحص السعة عبارة واحدة ذرية، ورموز
+# الدفع من عقدة مستأجرة لكل عامل، وصندوق الصادر يحجز صفوفه قبل الإرسال.
+async def run_sharded_webhook(factory, cleanup, workers, token, base_url, webhook_url, path, secret_token=None,
+                              listen="0.0.0.0", port=8443, max_connections=40, report_interval=60):
+    webhook.check_webhook_config(webhook_url, secret_token)
+    stop_event = webhook.stop_signal()
+    router = ShardRouter(factory, cleanup, workers)
+    await router.start()
+    server = ShardedWebhookServer(router, path, secret_token, listen, port)
+    try:
+        await server.start()
+        async with Bot(token, base_url=base_url) as bot:
+            await webhook.set_webhook(bot, webhook_url, secret_token, max_connections)
+        await webhook.serve_until_stopped(server, stop_event, report_interval)
+    finally:
+        await server.stop()
+        await router.stop()
+
+
+async def run_sharded_polling(factory, cleanup, workers, token, base_url, timeout=10, drop_pending_updates=True):
+    stop_event = webhook.stop_signal()
+    router = ShardRouter(factory, cleanup, workers)
+    await router.start()
+    try:
+        async with Bot(token, base_url=base_url) as bot:
+            await bot.delete_webhook(drop_pending_updates=drop_pending_updates)
+            offset = None
+            while not stop_event.is_set():
+                poll = asyncio.ensure_future(bot.get_updates(
+                    offset=offset, timeout=timeout, allowed_updates=Update.ALL_TYPES,
+                    read_timeout=timeout + 5))
+                stop = asyncio.ensure_future(stop_event.wait())
+                await asyncio.wait([poll, stop], return_when=asyncio.FIRST_COMPLETED)
+                if not poll.done():
+                    poll.cancel()
+                    break
+                stop.cancel()
+                try:
+                    updates = poll.result()
+                except Exception as e:
+                    logger.error(f"فشل في جلب التحديثات: {str(e)}")
+                    await asyncio.sleep(1)
+                    continue
+                for update in updates:
+                    router.dispatch(update.to_dict())
+                if updates:
+                    offset = updates[-1].update_id + 1
+    finally:
+        await router.stop()